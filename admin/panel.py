@@ -4,6 +4,13 @@ from aiogram.filters import Command
 from sqlalchemy.orm import joinedload
 from admin.auth import is_admin
 from database.models import SessionLocal, Channel, RSSSource, Post, User
+from core.rss_parser import fetch_stats
+from database.seen_index import seen_index
+from core.near_dup import near_dup
+from core.ai_processor import shared_results
+from core.llm_cache import llm_cache
+from core.llm_providers import llm_provider
+from core.llm_gateway import llm_gateway
 import json
 
 admin_router = Router()
@@ -19,15 +26,38 @@ def get_stats_text():
     pending_posts = db.query(Post).filter(Post.status == "pending").count()
     db.close()
 
+    skipped = fetch_stats['not_modified'] + fetch_stats['body_unchanged'] + fetch_stats['entries_unchanged']
     return (
         f"<b>📊 Статистика системы:</b>\n\n"
         f"<b>👥 Пользователей:</b> {total_users}\n"
         f"<b>📢 Каналов:</b> {total_channels} (активных: {active_channels})\n"
         f"<b>📰 RSS источников:</b> {total_sources}\n"
-        f"<b>📝 Постов:</b> {total_posts} (в очереди: {pending_posts})"
+        f"<b>📝 Постов:</b> {total_posts} (в очереди: {pending_posts})\n\n"
+        f"<b>🔁 Загрузок лент:</b> {fetch_stats['fetched']} (без разбора: {skipped} — "
+        f"304: {fetch_stats['not_modified']}, то же тело: {fetch_stats['body_unchanged']}, "
+        f"те же записи: {fetch_stats['entries_unchanged']})\n"
+        f"<b>🚦 Отложено по хостам:</b> 429/503: {fetch_stats['throttled']}, "
+        f"предохранитель: {fetch_stats['host_skipped']}\n"
+        f"<b>🧠 Проверки дублей:</b> из памяти {seen_index.stats['memory_hit'] + seen_index.stats['memory_miss']}, "
+        f"через БД {seen_index.stats['db_fallback']}, почти-дубликатов отсеяно: {near_dup.stats['dropped']}\n"
+        f"<b>🤖 Генераций AI:</b> {shared_results.stats['misses']} "
+        f"(переиспользовано для других каналов: {shared_results.stats['hits'] + shared_results.stats['joined']})\n"
+        f"<b>💾 Кэш LLM:</b> {llm_cache.size()} ответов, попаданий {llm_cache.stats['hits']}, "
+        f"промахов {llm_cache.stats['misses']}\n"
+        f"<b>🔌 Провайдер LLM ({llm_provider.name}):</b> запросов {llm_provider.stats['calls']}, "
+        f"ошибок {llm_provider.stats['errors']}, таймаутов {llm_provider.stats['timeouts']}, "
+        f"p50 {_seconds(llm_provider.latency(0.5))}, p95 {_seconds(llm_provider.latency(0.95))}, "
+        f"подстраховано другой моделью {llm_gateway.stats['hedged']} (из них быстрее {llm_gateway.stats['hedge_won']})\n"
+        f"<b>🛡 Шлюз LLM:</b> предел параллельности {llm_gateway.limit.limit:.1f}, в работе {llm_gateway.limit.inflight}, "
+        f"предохранитель: {llm_gateway.breaker.state}, срабатываний {llm_gateway.stats['breaker_trips']}, "
+        f"отклонено запросов без отправки {llm_gateway.stats['rejected']}"
     )
 
 
+def _seconds(value):
+    return "—" if value is None else "{:.1f} с".format(value)
+
+
 @admin_router.message(Command("admin"))
 async def admin_panel(message: Message):
     if not is_admin(message.from_user.id):
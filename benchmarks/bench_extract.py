@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк извлечения текста и картинок из записей RSS.
+
+Сравнивает прежний вариант (два прохода BeautifulSoup с html.parser: отдельно
+для текста и для <img>) с однопроходным extract_text_and_images на фикстурах
+из benchmarks/fixtures и сверяет результаты: картинки, текст как есть и текст
+без содержимого script/style, которое новый вариант намеренно вырезает.
+
+Фикстуры — снимки реальных лент (BBC News, heise online, NPR, Slashdot, The Verge)
+из тестового корпуса пакета rss-parser (https://github.com/dhvcc/rss-parser).
+Запуск: python benchmarks/bench_extract.py [повторов]
+"""
+
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feedparser
+from bs4 import BeautifulSoup
+
+from core.rss_parser import parse_entry
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def legacy_extract_content(entry, strip_code: bool = False) -> str:
+    """strip_code — дополнительно убрать script/style: эталон для сверки с новым вариантом."""
+    content = ''
+    if 'content' in entry:
+        content = entry.content[0].value
+    elif 'summary' in entry:
+        content = entry.summary
+    elif 'description' in entry:
+        content = entry.description
+    soup = BeautifulSoup(content, 'html.parser')
+    if strip_code:
+        for tag in soup(['script', 'style']):
+            tag.decompose()
+    text = soup.get_text(separator=' ', strip=True)
+    text = ' '.join(text.split())
+    return text[:2000]
+
+
+def legacy_extract_media(entry) -> List[str]:
+    media_urls = []
+    if 'enclosures' in entry:
+        for enclosure in entry.enclosures:
+            if enclosure.get('type', '').startswith('image'):
+                media_urls.append(enclosure.href)
+    if 'media_content' in entry:
+        for media in entry.media_content:
+            if media.get('type', '').startswith('image'):
+                media_urls.append(media['url'])
+    if 'media_thumbnail' in entry:
+        for thumb in entry.media_thumbnail:
+            if thumb.get('url'):
+                media_urls.append(thumb['url'])
+    if 'content' in entry and not media_urls:
+        soup = BeautifulSoup(entry.content[0].value, 'html.parser')
+        for img in soup.find_all('img')[:3]:
+            src = img.get('src')
+            if src and src.startswith('http'):
+                media_urls.append(src)
+    return list(dict.fromkeys(media_urls))[:1]
+
+
+def legacy_parse_entry(entry) -> Dict:
+    return {'content': legacy_extract_content(entry), 'media': legacy_extract_media(entry)}
+
+
+def bench(func, entries, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for entry in entries:
+            func(entry)
+    return (time.perf_counter() - started) / (repeat * len(entries)) * 1e6
+
+
+def compare(entries) -> Dict[str, int]:
+    """Сколько записей совпало с прежним вариантом: по картинкам, по тексту и по тексту без script/style."""
+    same = {'media': 0, 'text': 0, 'text_no_code': 0}
+    for entry in entries:
+        legacy, current = legacy_parse_entry(entry), parse_entry(entry)
+        same['media'] += legacy['media'] == current['media']
+        same['text'] += legacy['content'] == current['content']
+        same['text_no_code'] += legacy_extract_content(entry, strip_code=True) == current['content']
+    return same
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'fixture':<20}{'entries':>8}{'legacy, мкс':>13}{'single-pass, мкс':>18}{'ускорение':>11}"
+          f"{'картинки':>10}{'текст':>8}{'без script/style':>18}")
+    mismatched = 0
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+            entries = feedparser.parse(f.read()).entries
+
+        same = compare(entries)
+        total = len(entries)
+        mismatched += (total - same['media']) + (total - same['text_no_code'])
+        legacy = bench(legacy_parse_entry, entries, repeat)
+        single = bench(parse_entry, entries, repeat)
+        print(f"{name:<20}{total:>8}{legacy:>13.1f}{single:>18.1f}{legacy / single:>10.1f}x"
+              f"{same['media']:>6}/{total:<3}{same['text']:>4}/{total:<3}{same['text_no_code']:>14}/{total:<3}")
+    if mismatched:
+        print(f"Расхождений с прежним вариантом (кроме вырезанных script/style): {mismatched}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
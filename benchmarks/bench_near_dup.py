@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска почти-дубликатов (core/near_dup.py) на большом канале.
+
+Генерирует синтетический корпус из N постов (по умолчанию 100 000) со словарем
+с распределением Ципфа, строит LSH-индекс и замеряет:
+  - стоимость подписи одной записи;
+  - время построения индекса из готовых подписей (так индекс собирается при старте);
+  - задержку запроса для новой записи и для пересказа существующей;
+  - полноту на пересказах и долю ложных срабатываний на новых записях;
+  - выигрыш относительно полного перебора подписей.
+Перед замерами проверяет, что выпуски регулярной новости, различающиеся только
+числами («курс на 5 мая» и «на 6 мая»), не считаются дубликатами, а пересказ — считается.
+Запуск: python benchmarks/bench_near_dup.py [число постов]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.near_dup import LSHIndex, minhash_signature, signature_value, similarity
+from config.settings import NEAR_DUP_THRESHOLD
+
+QUERIES = 1000
+WORDS_PER_POST = 80
+
+
+def make_vocabulary(size: int, rng: random.Random):
+    letters = 'абвгдежзийклмнопрстуфхцчшщыэюя'
+    return list({''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)})
+
+
+def make_post(vocabulary, cum_weights, rng: random.Random):
+    words = rng.choices(vocabulary, cum_weights=cum_weights, k=WORDS_PER_POST)
+    return ' '.join(words[:8]), ' '.join(words[8:])
+
+
+def rewrite(title: str, text: str, vocabulary, rng: random.Random, share: float = 0.15):
+    """Пересказ: заменяем часть слов и немного перемешиваем порядок."""
+    words = text.split()
+    for i in range(len(words)):
+        if rng.random() < share:
+            words[i] = rng.choice(vocabulary)
+    cut = rng.randint(0, len(words) // 4)
+    return title, ' '.join(words[cut:] + words[:cut])
+
+
+# (запись, другая запись, должны ли они считаться дубликатами)
+RECURRING_CASES = [
+    (("Курс доллара на 5 мая",
+      "Центробанк установил официальный курс доллара на 5 мая в размере 92,1 рубля. Курс евро составил "
+      "99,4 рубля. Накануне регулятор снизил курс доллара, следует из данных на сайте ЦБ."),
+     ("Курс доллара на 6 мая",
+      "Центробанк установил официальный курс доллара на 6 мая в размере 91,8 рубля. Курс евро составил "
+      "98,7 рубля. Накануне регулятор снизил курс доллара, следует из данных на сайте ЦБ."),
+     False),
+    (("Apple выпустила iOS 18.1",
+      "Компания Apple выпустила обновление iOS 18.1 для iPhone. В новой версии исправлены ошибки "
+      "и улучшена стабильность системы. Обновление доступно в настройках."),
+     ("Apple выпустила iOS 18.2",
+      "Компания Apple выпустила обновление iOS 18.2 для iPhone. В новой версии исправлены ошибки "
+      "и улучшена стабильность системы. Обновление доступно в настройках."),
+     False),
+    (("Apple выпустила iOS 18.1",
+      "Компания Apple выпустила обновление iOS 18.1 для iPhone. В новой версии исправлены ошибки "
+      "и улучшена стабильность системы. Обновление доступно в настройках."),
+     ("Вышла iOS 18.1 для iPhone",
+      "Apple выпустила обновление iOS 18.1. В новой версии исправлены ошибки и улучшена "
+      "стабильность системы, обновление уже доступно в настройках iPhone."),
+     True),
+]
+
+
+def check_recurring_stories():
+    """Регрессия: числа различают выпуски регулярных новостей, но не мешают ловить пересказы."""
+    for first, second, duplicate in RECURRING_CASES:
+        score = similarity(signature_value(minhash_signature(*first)), signature_value(minhash_signature(*second)))
+        print(f"  «{first[0]}» / «{second[0]}»: сходство {score:.2f}")
+        assert (score >= NEAR_DUP_THRESHOLD) == duplicate, \
+            f"«{first[0]}» и «{second[0]}» {'не ' if duplicate else ''}должны считаться дубликатами"
+
+
+def build_index(signatures, now: datetime) -> LSHIndex:
+    index = LSHIndex()
+    for post_id, signature in enumerate(signatures):
+        index.add(post_id, signature, now)
+    return index
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print("Регулярные новости:")
+    check_recurring_stories()
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(50_000, rng)
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    print(f"Корпус: {count} постов по {WORDS_PER_POST} слов, порог сходства {NEAR_DUP_THRESHOLD}")
+    posts = [make_post(vocabulary, cum_weights, rng) for _ in range(count)]
+
+    started = time.perf_counter()
+    signatures = [minhash_signature(title, text) for title, text in posts]
+    elapsed = time.perf_counter() - started
+    print(f"Подпись: {elapsed / count * 1e6:.0f} мкс на запись ({elapsed:.1f} с на весь корпус)")
+
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    index = build_index(signatures, now)
+    build = time.perf_counter() - started
+    # Память меряем отдельным построением: tracemalloc заметно замедляет аллокации
+    tracemalloc.start()
+    traced = build_index(signatures, now)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+    print(f"Построение индекса: {build:.2f} с, память ~{memory / 1024 / 1024:.0f} МБ")
+
+    since = datetime.min
+    probes_new = [minhash_signature(*make_post(vocabulary, cum_weights, rng)) for _ in range(QUERIES)]
+    targets = rng.sample(range(count), QUERIES)
+    probes_dup = [minhash_signature(*rewrite(*posts[i], vocabulary, rng)) for i in targets]
+
+    started = time.perf_counter()
+    false_positives = sum(index.query(s, since, NEAR_DUP_THRESHOLD) is not None for s in probes_new)
+    query_new = (time.perf_counter() - started) / QUERIES
+    started = time.perf_counter()
+    found = sum(
+        (match := index.query(s, since, NEAR_DUP_THRESHOLD)) is not None and match[0] == target
+        for s, target in zip(probes_dup, targets)
+    )
+    query_dup = (time.perf_counter() - started) / QUERIES
+    print(f"Запрос, новая запись: {query_new * 1e6:.0f} мкс, ложных срабатываний {false_positives}/{QUERIES}")
+    print(f"Запрос, пересказ: {query_dup * 1e6:.0f} мкс, найдено {found}/{QUERIES}")
+
+    values = [signature_value(s) for s in signatures]
+    sample = probes_dup[:20]
+    started = time.perf_counter()
+    for signature in sample:
+        probe = signature_value(signature)
+        max(similarity(probe, other) for other in values)
+    brute = (time.perf_counter() - started) / len(sample)
+    print(f"Полный перебор: {brute * 1e3:.0f} мс на запрос (LSH быстрее в {brute / query_dup:.0f} раз)")
+
+
+if __name__ == "__main__":
+    main()
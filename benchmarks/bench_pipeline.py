@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон цикла опроса без внешней сети: загрузка → разбор → отсев дублей → AI → очередь.
+
+Ленты отдает локальный aiohttp-сервер, замеряется один вызов Scheduler.check_rss_sources —
+тот же путь, что у планировщика. LLM заменена детерминированной заглушкой
+(LLM_PROVIDER=stub, core/llm_providers.py) с задержкой LLM_STUB_LATENCY и долей ошибок
+LLM_STUB_ERROR_RATE; база — временный SQLite. Записи берутся из benchmarks/fixtures и
+размножаются до нужного числа с уникальными заголовками, поэтому поиск почти-дубликатов
+в прогоне отключен. Замеряет время цикла, число запросов к LLM и их задержки по статистике адаптера.
+Запуск: python benchmarks/bench_pipeline.py [записей на канал, не больше 20] [каналов]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_TMP = tempfile.mkdtemp(prefix='bench_pipeline_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TMP, 'bench.db')
+os.environ.setdefault('LLM_PROVIDER', 'stub')
+os.environ['LLM_CACHE_ENABLED'] = 'false'
+os.environ['NEAR_DUP_ENABLED'] = 'false'
+# Все ленты на одном локальном хосте: бережный темп опроса здесь не замеряем
+os.environ.setdefault('HOST_RATE_PER_SEC', '1000')
+os.environ.setdefault('HOST_BURST', '1000')
+
+from aiohttp import web
+
+from core.http_client import close_http_session
+from core.llm_providers import llm_provider
+from core.rss_parser import _MAX_FEED_ENTRIES, parse_feed_document, shutdown_parse_executor
+from core.scheduler import Scheduler
+from database import crud
+from database.models import SessionLocal, Post
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_entries():
+    entries = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+            entries.extend(parse_feed_document(f.read())['entries'])
+    return entries
+
+
+def make_feed(templates, count: int, tag: str):
+    """count уникальных записей, новые первыми — как их отдает лента."""
+    feed = []
+    for i in range(count):
+        entry = dict(templates[i % len(templates)])
+        entry['guid'] = '{}-{}'.format(tag, i)
+        entry['title'] = '{} ({} #{})'.format(entry['title'], tag, i)
+        feed.append(entry)
+    return list(reversed(feed))
+
+
+def render_feed(entries, tag: str) -> bytes:
+    items = ''.join(
+        '<item><title>{}</title><link>{}</link><guid>{}</guid><description>{}</description></item>'.format(
+            escape(entry['title']), escape(entry.get('link') or ''), escape(entry['guid']), escape(entry['content'])
+        )
+        for entry in entries
+    )
+    return '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel><title>{}</title>{}</channel></rss>'.format(
+        tag, items
+    ).encode('utf-8')
+
+
+async def serve_feeds(feeds):
+    """Поднимает локальный сервер лент на свободном порту; возвращает runner и базовый URL."""
+    async def handler(request):
+        return web.Response(body=feeds[request.match_info['tag']], content_type='application/rss+xml')
+
+    app = web.Application()
+    app.router.add_get('/{tag}.xml', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, 'http://127.0.0.1:{}'.format(port)
+
+
+async def run(per_channel: int, channels: int):
+    templates = load_entries()
+    feeds = {
+        'c{}'.format(n): render_feed(make_feed(templates, per_channel, 'c{}'.format(n)), 'c{}'.format(n))
+        for n in range(channels)
+    }
+    runner, base_url = await serve_feeds(feeds)
+
+    db = SessionLocal()
+    user = crud.get_or_create_user(db, 1, 'bench')
+    for n in range(channels):
+        channel = crud.create_channel(db, user.id, str(-1000 - n), 'bench {}'.format(n), 'технологии')
+        crud.add_rss_source(db, channel.id, '{}/c{}.xml'.format(base_url, n), 'bench')
+    db.close()
+
+    scheduler = Scheduler(bot=None)
+    try:
+        started = time.perf_counter()
+        await scheduler.check_rss_sources()
+        elapsed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+        await close_http_session()
+        shutdown_parse_executor()
+
+    db = SessionLocal()
+    posts = db.query(Post).count()
+    db.close()
+    stats = llm_provider.stats
+    p50, p95 = llm_provider.latency(0.5), llm_provider.latency(0.95)
+    print(f"Провайдер: {llm_provider.name}, каналов {channels} по {per_channel} записей")
+    print(f"Цикл: {elapsed:.2f} с, в очередь {posts} постов ({posts / elapsed:.1f} постов/с)")
+    print(f"Запросов к LLM: {stats['calls']}, ошибок {stats['errors']}, таймаутов {stats['timeouts']}")
+    if p50 is not None:
+        print(f"Задержка ответа: p50 {p50 * 1e3:.0f} мс, p95 {p95 * 1e3:.0f} мс")
+
+
+def main():
+    # Больше _MAX_FEED_ENTRIES записей разбор ленты все равно не отдаст
+    per_channel = min(int(sys.argv[1]) if len(sys.argv) > 1 else 20, _MAX_FEED_ENTRIES)
+    channels = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    asyncio.run(run(per_channel, channels))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,10 +8,14 @@ from bot.keyboards import Keyboards
 from database.crud import *
 from database import crud
 from database.models import SessionLocal, Channel, RSSSource, Post
+from database.seen_index import seen_index
+from core.near_dup import near_dup
 from core.publisher import Publisher
 from core.ai_processor import AIProcessor
+from core.post_content import PENDING_CONTENT, ensure_post_content
 from config.settings import ADMIN_IDS
 from datetime import datetime, timedelta
+import asyncio
 import random
 
 router = Router()
@@ -214,6 +218,29 @@ async def rss_sources_menu(callback: CallbackQuery):
     )
 
 
+@router.callback_query(F.data.startswith("source_"))
+async def toggle_rss_source(callback: CallbackQuery):
+    source_id = int(callback.data.split("_")[1])
+    db = SessionLocal()
+    source = crud.toggle_source_active(db, source_id)
+    if not source:
+        await callback.answer("RSS источник не найден", show_alert=True)
+        db.close()
+        return
+
+    channel_id = source.channel_id
+    sources = db.query(RSSSource).filter(RSSSource.channel_id == channel_id).all()
+    db.close()
+
+    status = "включен" if source.is_active else "приостановлен"
+    await callback.answer(f"Источник «{source.name}» {status}")
+    await safe_edit_text(
+        callback.message,
+        "📰 Ваши RSS-источники:",
+        reply_markup=keyboards.rss_sources_menu(channel_id, sources)
+    )
+
+
 @router.callback_query(F.data.startswith("add_rss_"))
 async def add_rss_manual_start(callback: CallbackQuery, state: FSMContext):
     channel_id = int(callback.data.split("_")[2])
@@ -240,12 +267,12 @@ async def process_manual_rss(message: Message, state: FSMContext):
     else:
         formatted_url = url_input
 
-    import feedparser
-    feed = feedparser.parse(formatted_url)
+    from core.rss_parser import load_feed
+    feed = await load_feed(formatted_url)
 
-    if feed.entries:
+    if feed and feed['entries']:
         db = SessionLocal()
-        title = feed.feed.get('title', formatted_url[:50])
+        title = feed['title'] or formatted_url[:50]
         add_rss_source(db, channel_id, formatted_url, title)
         sources = db.query(RSSSource).filter_by(channel_id=channel_id).all()
         db.close()
@@ -290,8 +317,9 @@ async def create_post_start(callback: CallbackQuery, bot: Bot):
         parser = RSSParser()
         async with parser:
             all_entries = []
-            for source in sources:
-                entries = await parser.parse_feed(source.url)
+            # Свежие ленты берем из кэша (его наполняет и планировщик), остальные качаем параллельно
+            results = await asyncio.gather(*(parser.parse_feed_cached(source.url) for source in sources))
+            for entries in results:
                 if entries:
                     all_entries.extend(entries[:3])
 
@@ -302,12 +330,9 @@ async def create_post_start(callback: CallbackQuery, bot: Bot):
 
             await safe_edit_text(msg, "🧠 Обрабатываю новость с помощью AI...")
             
-            # Ищем новость, которая еще не была опубликована
-            selected_entry = None
-            for entry in all_entries:
-                if not check_post_duplicate(db, channel_id, entry['title'], entry['content'], entry.get('guid')):
-                    selected_entry = entry
-                    break
+            # Ищем новость, которая еще не была опубликована (проверка дубликатов — одной пачкой)
+            new_entries = filter_new_entries(db, channel_id, all_entries)
+            selected_entry = new_entries[0] if new_entries else None
             
             if not selected_entry:
                 await safe_edit_text(msg, "❌ Все найденные новости уже были опубликованы.")
@@ -403,7 +428,7 @@ async def show_post_preview(callback: CallbackQuery, bot: Bot):
         f"<b>Источник:</b> {post.source_url[:50]}...\n\n"
         f"<b>📄 Финальный текст поста:</b>\n"
         f"{'─' * 30}\n"
-        f"{post.processed_content}\n"
+        f"{post.processed_content or PENDING_CONTENT}\n"
         f"{'─' * 30}"
     )
     
@@ -462,7 +487,7 @@ async def publish_next_post(callback: CallbackQuery, bot: Bot):
         channel = db.query(Channel).filter_by(id=channel_id).first()
         message_id = await publisher.publish_post(
             channel.channel_id,
-            post.processed_content,
+            await ensure_post_content(db, post, AIProcessor()),
             post.media_urls
         )
         
@@ -521,6 +546,8 @@ async def clear_queue_execute(callback: CallbackQuery):
     
     db.commit()
     db.close()
+    seen_index.invalidate(channel_id)
+    near_dup.invalidate(channel_id)
     
     await callback.answer(f"Удалено {deleted_count} постов из очереди", show_alert=True)
     
@@ -547,7 +574,7 @@ async def publish_specific_post(callback: CallbackQuery, bot: Bot):
         channel = db.query(Channel).filter_by(id=post.channel_id).first()
         message_id = await publisher.publish_post(
             channel.channel_id,
-            post.processed_content,
+            await ensure_post_content(db, post, AIProcessor()),
             post.media_urls
         )
         
@@ -609,7 +636,7 @@ async def edit_post_start(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text(
         f"<b>Редактирование поста</b>\n\n"
         f"<b>Текущий текст:</b>\n"
-        f"{post.processed_content}\n\n"
+        f"{post.processed_content or PENDING_CONTENT}\n\n"
         f"Отправьте новый текст поста:"
     )
     await state.set_state(ChannelStates.editing_post)
@@ -662,7 +689,7 @@ async def copy_post_text(callback: CallbackQuery):
     # Отправляем текст поста как обычное сообщение для копирования
     await callback.message.answer(
         f"<b>📋 Текст поста для копирования:</b>\n\n"
-        f"<code>{post.processed_content}</code>",
+        f"<code>{post.processed_content or PENDING_CONTENT}</code>",
         parse_mode="HTML"
     )
     await callback.answer("Текст скопирован в чат", show_alert=True)
@@ -686,7 +713,7 @@ async def approve_post(callback: CallbackQuery, bot: Bot):
         channel = db.query(Channel).filter_by(id=post.channel_id).first()
         message_id = await publisher.publish_post(
             channel.channel_id,
-            post.processed_content,
+            await ensure_post_content(db, post, AIProcessor()),
             post.media_urls
         )
         
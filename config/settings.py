@@ -34,9 +34,100 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 DATABASE_URL = _normalize_database_url(os.getenv("DATABASE_URL"))
 ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x]
 RSS_CHECK_INTERVAL = 3600
+# Адаптивный опрос: интервал каждого источника подстраивается под темп ленты в этих границах
+RSS_MIN_INTERVAL = int(os.getenv("RSS_MIN_INTERVAL", "300"))
+RSS_MAX_INTERVAL = int(os.getenv("RSS_MAX_INTERVAL", "86400"))
+# Как часто планировщик ищет источники, которым пора на проверку
+RSS_SCHEDULER_TICK = int(os.getenv("RSS_SCHEDULER_TICK", "60"))
+# После стольких ошибок подряд источник автоматически приостанавливается
+RSS_MAX_ERRORS = int(os.getenv("RSS_MAX_ERRORS", "8"))
+# Параллельный опрос лент: общий лимит одновременных загрузок и лимит на один хост
+RSS_FETCH_CONCURRENCY = int(os.getenv("RSS_FETCH_CONCURRENCY", "20"))
+RSS_FETCH_PER_HOST = int(os.getenv("RSS_FETCH_PER_HOST", "2"))
+# Загрузка ленты: таймаут запроса (сек) и предельный размер тела (байт)
+RSS_FETCH_TIMEOUT = int(os.getenv("RSS_FETCH_TIMEOUT", "10"))
+RSS_MAX_FEED_BYTES = int(os.getenv("RSS_MAX_FEED_BYTES", str(5 * 1024 * 1024)))
+# Бережный опрос хостов: темп запросов к одному хосту (запр./сек и запас на всплеск),
+# число ошибок подряд до размыкания предохранителя и пауза перед пробным запросом (сек)
+HOST_RATE_PER_SEC = float(os.getenv("HOST_RATE_PER_SEC", "1"))
+HOST_BURST = float(os.getenv("HOST_BURST", "5"))
+HOST_FAILURE_THRESHOLD = int(os.getenv("HOST_FAILURE_THRESHOLD", "5"))
+HOST_RESET_TIMEOUT = int(os.getenv("HOST_RESET_TIMEOUT", "300"))
+# Общий HTTP-клиент: размер пула соединений, лимит на хост, TTL кэша DNS и keep-alive (сек)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "100"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "8"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+# Кэш разобранных лент для ручного создания постов: время жизни (сек) и границы по памяти
+FEED_CACHE_TTL = int(os.getenv("FEED_CACHE_TTL", "600"))
+FEED_CACHE_MAX_ENTRIES = int(os.getenv("FEED_CACHE_MAX_ENTRIES", "500"))
+FEED_CACHE_MAX_BYTES = int(os.getenv("FEED_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Индекс виденных записей в памяти: размер точного LRU на канал (ключей), доля ложных
+# срабатываний Bloom-фильтра и период пересборки из БД (сек)
+SEEN_INDEX_EXACT_SIZE = int(os.getenv("SEEN_INDEX_EXACT_SIZE", "10000"))
+SEEN_INDEX_ERROR_RATE = float(os.getenv("SEEN_INDEX_ERROR_RATE", "0.01"))
+SEEN_INDEX_REBUILD = int(os.getenv("SEEN_INDEX_REBUILD", "86400"))
+# Почти-дубликаты (одна новость из разных источников): порог оценки сходства Жаккара 0..1
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.6"))
+# Разбор лент вне event loop: process | thread | inline; 0 воркеров — по числу ядер
+RSS_PARSE_EXECUTOR = os.getenv("RSS_PARSE_EXECUTOR", "process").lower()
+RSS_PARSE_WORKERS = int(os.getenv("RSS_PARSE_WORKERS", "0"))
 MAX_CHANNELS_PER_USER = 5
 MAX_RSS_PER_CHANNEL = 10
 DEFAULT_POST_INTERVAL = 7200
 MAX_QUEUE_SIZE = 50
 AI_MODELS = ["gpt-4o-mini", "gpt-4"]
 DEFAULT_AI_MODEL = "gpt-4o-mini"
+# Источник ответов LLM: g4f, openai (любой OpenAI-совместимый сервер, в том числе локальный)
+# или stub — офлайн-заглушка для нагрузочных тестов и бенчмарков без сети
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "g4f").lower()
+LLM_API_BASE = os.getenv("LLM_API_BASE", "http://localhost:8000/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY", os.getenv("OPENAI_API_KEY", ""))
+# Заглушка: средняя задержка ответа (сек) и доля ответов с ошибкой
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0.5"))
+LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+# Хеджирование: если модель не ответила за перцентиль своих недавних задержек (но не раньше MIN_DELAY сек;
+# пока статистики нет — через DEFAULT_DELAY сек), тот же запрос уходит другой модели из AI_MODELS.
+# BUDGET — предельная доля дополнительных запросов от основных
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))
+# Адаптивный предел одновременных запросов к LLM (AIMD): растет на ответах быстрее LLM_TARGET_LATENCY сек,
+# вдвое падает на ошибках, таймаутах и медленных ответах, оставаясь в границах MIN..MAX
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_TARGET_LATENCY = float(os.getenv("LLM_TARGET_LATENCY", "12"))
+# Предохранитель провайдера LLM: после N ошибок подряд запросы не отправляются RESET сек (посты
+# оформляются локально, без LLM), затем один пробный запрос проверяет, ожил ли провайдер
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = int(os.getenv("LLM_BREAKER_RESET", "60"))
+# Постоянный кэш ответов LLM (SQLite-файл): время жизни ответа (сек) и предельный суммарный размер (байт)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 86400)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Начальный предел одновременных запросов к LLM; дальше его подстраивает AIMD в границах LLM_MIN/MAX_CONCURRENCY
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "4"))
+# Сколько записей одного канала упаковывать в один запрос к LLM (1 — каждая запись отдельным запросом)
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "5"))
+# Ленивая генерация: в очередь кладется исходная запись, а текст поста генерируется AI
+# не раньше чем за AI_LAZY_LEAD_TIME сек до публикации (удаленные и отклоненные посты не стоят запросов к LLM)
+AI_LAZY_GENERATION = os.getenv("AI_LAZY_GENERATION", "").lower() == "true"
+AI_LAZY_LEAD_TIME = int(os.getenv("AI_LAZY_LEAD_TIME", "1800"))
+# Общие результаты AI для каналов с одинаковыми настройками: сколько постов помнить и как долго (сек)
+AI_SHARE_MAX_ENTRIES = int(os.getenv("AI_SHARE_MAX_ENTRIES", "1000"))
+AI_SHARE_TTL = int(os.getenv("AI_SHARE_TTL", "86400"))
+
+# WebSub (PubSubHubbub): push-доставка лент через хаб. Нужен публичный адрес, по которому
+# хаб достучится до встроенного HTTP-приемника (WEBSUB_HOST:WEBSUB_PORT за прокси/фаерволом)
+WEBSUB_ENABLED = os.getenv("WEBSUB_ENABLED", "").lower() == "true"
+WEBSUB_CALLBACK_URL = os.getenv("WEBSUB_CALLBACK_URL", "").rstrip("/")
+WEBSUB_HOST = os.getenv("WEBSUB_HOST", "0.0.0.0")
+WEBSUB_PORT = int(os.getenv("WEBSUB_PORT", "8080"))
+WEBSUB_SECRET = os.getenv("WEBSUB_SECRET") or (BOT_TOKEN or "")
+WEBSUB_LEASE_SECONDS = int(os.getenv("WEBSUB_LEASE_SECONDS", str(5 * 86400)))
+# За сколько секунд до окончания аренды продлевать подписку
+WEBSUB_RENEW_BEFORE = int(os.getenv("WEBSUB_RENEW_BEFORE", "3600"))
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Dict, List
+
+from config.settings import AI_BATCH_SIZE
+from core.ai_processor import AIProcessor
+
+
+class AIWorkerPool:
+    """Ограниченный пул AI-обработки записей.
+
+    Этап опроса отдает записи в submit() сразу, не дожидаясь друг друга, — задержки LLM
+    перекрываются. Сколько запросов к LLM идет одновременно, решает адаптивный предел
+    шлюза (core/llm_gateway.py): собственный предел пула не дал бы тому подняться выше.
+    Порядок постановки в очередь канала держит вызывающий под channel_lock().
+    submit_many() упаковывает записи пачками по batch_size в один запрос к LLM.
+    """
+
+    def __init__(self, processor: AIProcessor, batch_size: int = AI_BATCH_SIZE):
+        self.processor = processor
+        self.batch_size = max(1, batch_size)
+        self._channel_locks: Dict[int, asyncio.Lock] = {}
+
+    def submit(self, entry: Dict, ch_settings: Dict) -> asyncio.Task:
+        return asyncio.create_task(self._run(entry, ch_settings))
+
+    async def _run(self, entry: Dict, ch_settings: Dict) -> str:
+        return await self.processor.process_content(entry, ch_settings)
+
+    def submit_many(self, entries: List[Dict], ch_settings: Dict) -> List[asyncio.Future]:
+        """По future на каждую запись; отмена любой из них отменяет генерацию ее пачки."""
+        if self.batch_size == 1:
+            return [self.submit(entry, ch_settings) for entry in entries]
+        loop = asyncio.get_running_loop()
+        futures = []
+        for start in range(0, len(entries), self.batch_size):
+            chunk = entries[start:start + self.batch_size]
+            chunk_futures = [loop.create_future() for _ in chunk]
+            task = asyncio.create_task(self._run_batch(chunk, ch_settings))
+            task.add_done_callback(lambda t, fs=chunk_futures: self._resolve(t, fs))
+            for future in chunk_futures:
+                future.add_done_callback(lambda f, t=task: f.cancelled() and t.cancel())
+            futures.extend(chunk_futures)
+        return futures
+
+    async def _run_batch(self, entries: List[Dict], ch_settings: Dict) -> List[str]:
+        return await self.processor.process_batch(entries, ch_settings)
+
+    @staticmethod
+    def _resolve(task: asyncio.Task, futures: List[asyncio.Future]) -> None:
+        for i, future in enumerate(futures):
+            if future.done():
+                continue
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result()[i])
+
+    def channel_lock(self, channel_id: int) -> asyncio.Lock:
+        lock = self._channel_locks.get(channel_id)
+        if lock is None:
+            lock = self._channel_locks[channel_id] = asyncio.Lock()
+        return lock
@@ -1,13 +1,23 @@
 import asyncio
+import hashlib
+import json
+import logging
 import random
 import re
-from typing import Dict, List, Optional
+import time
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import g4f
-from g4f.errors import ModelNotFoundError
+from config.settings import AI_SHARE_MAX_ENTRIES, AI_SHARE_TTL
+from core.lang_detect import clearly_not_russian, is_russian
+from core.llm_cache import llm_cache
+from core.llm_gateway import LLMUnavailable, batch_cost, llm_gateway
+from core.llm_providers import ModelNotFoundError
 from utils.helpers import sanitize_html
 
+logger = logging.getLogger(__name__)
+
 
 def is_http_url(s: str) -> bool:
     try:
@@ -27,6 +37,125 @@ def md_to_html(text: str) -> str:
     return html
 
 
+async def complete(model: str, messages: List[Dict], timeout: Optional[float] = None,
+                   size: int = 1) -> Tuple[str, str]:
+    """Запрос к LLM через шлюз (core/llm_gateway.py) с постоянным кэшем ответов.
+
+    Возвращает ответ и модель, которая его дала: при хеджировании шлюз может ответить
+    другой моделью. Ключ кэша — модель, системные сообщения и остальные сообщения запроса;
+    ответ кэшируется под той моделью, которая ответила. Пустые ответы и ошибки не кэшируются.
+    """
+    system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    prompt = json.dumps([m for m in messages if m["role"] != "system"], ensure_ascii=False)
+    cached = llm_cache.get(model, system, prompt)
+    if cached is not None:
+        return cached, model
+    response, answered = await llm_gateway.complete(model, messages, timeout=timeout, size=size)
+    if isinstance(response, str) and response.strip():
+        llm_cache.put(answered, system, prompt, response)
+    return response, answered
+
+
+class SharedResults:
+    """Готовые посты, общие для всех каналов с одинаковыми настройками AI.
+
+    Ключ — хеш (модель, системный промпт, запрос с текстом записи, группа темы).
+    Помнит результаты в пределах ttl и max_entries (LRU), а одновременные запросы
+    с одним ключом ждут единственный вызов LLM вместо того, чтобы делать свои.
+    """
+
+    def __init__(self, max_entries: int = AI_SHARE_MAX_ENTRIES, ttl: int = AI_SHARE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        stored_at, text = item
+        if time.monotonic() - stored_at > self.ttl:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        self._items[key] = (time.monotonic(), text)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    async def run(self, key: str, generate: Callable[[], Awaitable[Tuple[str, bool]]]) -> str:
+        """Возвращает общий результат или вызывает generate() -> (текст, можно ли переиспользовать)."""
+        cached = self.get(key)
+        if cached is not None:
+            self.stats['hits'] += 1
+            return cached
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats['joined'] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # Отменили того, кто генерировал, а не нас — генерируем сами
+                return await self.run(key, generate)
+
+        future = self.claim(key)
+        try:
+            text, reusable = await generate()
+        except asyncio.CancelledError:
+            self.abandon(key, future)
+            raise
+        except Exception as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, text, reusable)
+        return text
+
+    def claim(self, key: str) -> Optional[asyncio.Future]:
+        """Регистрирует генерацию key; None — ее уже ведет кто-то другой (ждите через run())."""
+        if key in self._inflight:
+            return None
+        self.stats['misses'] += 1
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        return future
+
+    def resolve(self, key: str, future: asyncio.Future, text: Optional[str] = None, reusable: bool = False,
+                error: Optional[BaseException] = None) -> None:
+        """Отдает результат генерации, начатой claim(), всем, кто ее ждет."""
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            future.exception()  # ожидающих может не быть — помечаем исключение полученным
+            return
+        # Запасной вариант без LLM не запоминаем: следующий канал попробует снова
+        if reusable:
+            self.put(key, text)
+        future.set_result(text)
+
+    def abandon(self, key: str, future: asyncio.Future) -> None:
+        """Генерация не состоялась (отменена): ожидающие сгенерируют сами."""
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.cancel()
+
+
+shared_results = SharedResults()
+
+
 class AIProcessor:
     _SAFE_MODEL = "gpt-4o-mini"
     _SUPPORTED = {"gpt-4o-mini", "gpt-4"}
@@ -39,24 +168,163 @@ class AIProcessor:
         }
 
     async def process_content(self, entry: Dict, ch_settings: Dict) -> str:
+        model, sys_prompt, user_prompt, topic, russian, key = self._prepare(entry, ch_settings)
+        return await shared_results.run(
+            key, lambda: self._generate(entry, model, sys_prompt, user_prompt, topic, russian)
+        )
+
+    async def process_batch(self, entries: List[Dict], ch_settings: Dict) -> List[str]:
+        """Обрабатывает несколько записей одного канала меньшим числом запросов к LLM.
+
+        Записи с общими моделью и системным промптом уходят одним запросом с просьбой вернуть
+        JSON-массив постов. Если ответ не разобрался, записи пакета обрабатываются по одной —
+        параллельно. Ключи пакета регистрируются в shared_results как генерируемые, так что
+        такие же записи других каналов и вызовов ждут этот пакет, а не платят за свой запрос.
+        """
+        results: List[Optional[str]] = [None] * len(entries)
+        groups: Dict[Tuple[str, str], List[Tuple[int, tuple, asyncio.Future]]] = {}
+        joined: List[int] = []
+        owned: List[Tuple[str, asyncio.Future]] = []
+        for i, entry in enumerate(entries):
+            prepared = self._prepare(entry, ch_settings)
+            model, sys_prompt, key = prepared[0], prepared[1], prepared[5]
+            cached = shared_results.get(key)
+            if cached is not None:
+                shared_results.stats['hits'] += 1
+                results[i] = cached
+                continue
+            future = shared_results.claim(key)
+            if future is None:
+                # Ту же запись уже генерирует кто-то другой — дождемся его результата
+                joined.append(i)
+                continue
+            owned.append((key, future))
+            groups.setdefault((model, sys_prompt), []).append((i, prepared, future))
+
+        async def join(i: int) -> None:
+            results[i] = await self.process_content(entries[i], ch_settings)
+
+        async def single(i: int, prepared: tuple, future: asyncio.Future) -> None:
+            model, sys_prompt, user_prompt, topic, russian, key = prepared
+            try:
+                text, reusable = await self._generate(entries[i], model, sys_prompt, user_prompt, topic, russian)
+            except Exception as e:
+                shared_results.resolve(key, future, error=e)
+                raise
+            shared_results.resolve(key, future, text, reusable)
+            results[i] = text
+
+        async def batch(model: str, sys_prompt: str, items: List[Tuple[int, tuple, asyncio.Future]]) -> None:
+            generated = await self._generate_batch(model, sys_prompt, [entries[i] for i, _, _ in items]) \
+                if len(items) > 1 else None
+            if generated is None:
+                outcomes = await asyncio.gather(*(single(*item) for item in items), return_exceptions=True)
+                for outcome in outcomes:
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+                return
+            posts, reusable = generated
+            for (i, prepared, future), raw in zip(items, posts):
+                finalized = await self._ensure_russian(self._finalize_post(raw, prepared[3]))
+                results[i] = sanitize_html(finalized)
+                shared_results.resolve(prepared[5], future, results[i], reusable)
+                shared_results.stats['batched'] += 1
+
+        try:
+            outcomes = await asyncio.gather(
+                *(batch(model, sys_prompt, items) for (model, sys_prompt), items in groups.items()),
+                *(join(i) for i in joined),
+                return_exceptions=True
+            )
+        finally:
+            # Не дошедшие до результата генерации (отмена, ошибка) отпускаем: ожидающие сделают их сами
+            for key, future in owned:
+                shared_results.abandon(key, future)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return results
+
+    async def _generate_batch(self, model: str, sys_prompt: str,
+                              entries: List[Dict]) -> Optional[Tuple[List[str], bool]]:
+        """Посты пакета и можно ли делиться ими как ответом model; None — обрабатывать по одной."""
+        items = "\n\n".join(
+            "{}. Title: {}. Content: {}".format(n, entry['title'], entry['content'][:500])
+            for n, entry in enumerate(entries, 1)
+        )
+        user_prompt = (
+            "Переработай каждую из {} новостей в отдельный пост для Телеграм (до 900 симв. каждый). "
+            "Ответь ТОЛЬКО JSON-массивом из {} строк — готовых постов в том же порядке, без пояснений.\n\n{}"
+        ).format(len(entries), len(entries), items)
+        try:
+            raw, answered = await self._call_llm(model, sys_prompt, user_prompt,
+                                                 timeout=20 * batch_cost(len(entries)), size=len(entries))
+        except Exception as e:
+            logger.warning("Пакетный запрос к AI не удался (%d записей): %s", len(entries), e)
+            return None
+        posts = self._parse_batch(raw, len(entries))
+        if posts is None:
+            logger.warning("Некорректный ответ на пакетный запрос (%d записей), обрабатываем по одной",
+                           len(entries))
+            return None
+        return posts, answered == model
+
+    @staticmethod
+    def _parse_batch(raw: str, expected: int) -> Optional[List[str]]:
+        """Достает из ответа JSON-массив из expected непустых строк, иначе None."""
+        if not isinstance(raw, str):
+            return None
+        text = raw.strip()
+        # Модели любят оборачивать JSON в ```json ... ```
+        fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+        if fenced:
+            text = fenced.group(1).strip()
+        start, end = text.find("["), text.rfind("]")
+        if start < 0 or end < start:
+            return None
+        try:
+            posts = json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+        if not isinstance(posts, list) or len(posts) != expected:
+            return None
+        if not all(isinstance(p, str) and p.strip() for p in posts):
+            return None
+        return posts
+
+    def _prepare(self, entry: Dict, ch_settings: Dict) -> tuple:
+        """Модель, промпты, тема, русский ли источник и ключ общего результата для записи."""
         model = ch_settings.get("ai_model") or self._SAFE_MODEL
         if model not in self._SUPPORTED:
             model = self._SAFE_MODEL
         topic = ch_settings.get("topic", "новости")
-        sys_prompt = (ch_settings.get("ai_prompt") or self._default_prompt().format(topic=topic))
+        # Язык источника определяем локально до обращения к LLM: русский текст не нужно переводить
+        russian = is_russian("{} {}".format(entry['title'], entry['content'][:500]))
+        default_prompt = self._default_prompt_ru() if russian else self._default_prompt()
+        sys_prompt = (ch_settings.get("ai_prompt") or default_prompt.format(topic=topic))
         user_prompt = "Переработай эту новость в пост для Телеграм (до 900 симв.): Title: {}. Content: {}".format(
             entry['title'], entry['content'][:500])
+        # Каналы с той же моделью, промптом и группой темы получают один и тот же пост
+        key = shared_results.make_key(model, sys_prompt, user_prompt, self._topic_group(topic))
+        return model, sys_prompt, user_prompt, topic, russian, key
+
+    async def _generate(self, entry: Dict, model: str, sys_prompt: str, user_prompt: str,
+                        topic: str, russian: bool = False) -> Tuple[str, bool]:
         try:
-            raw = await self._call_llm(model, sys_prompt, user_prompt)
-        except ModelNotFoundError:
-            raw = await self._call_llm(self._SAFE_MODEL, sys_prompt, user_prompt)
+            try:
+                raw, answered = await self._call_llm(model, sys_prompt, user_prompt)
+            except ModelNotFoundError:
+                raw, answered = await self._call_llm(self._SAFE_MODEL, sys_prompt, user_prompt)
+        except LLMUnavailable:
+            # Провайдер нездоров — не ждем таймаутов и не просим переводов, оформляем сами
+            return self._local_format(entry['title'], entry['content'], topic), False
         except Exception as e:
-            import logging
-            logging.getLogger(__name__).exception("AI error, fallback: %s", e)
-            return await self._fallback_format(entry, topic)
+            logger.exception("AI error, fallback: %s", e)
+            return await self._fallback_format(entry, topic, russian), False
         finalized = self._finalize_post(raw, topic)
         finalized = await self._ensure_russian(finalized)
-        return sanitize_html(finalized)
+        # Общий результат хранится под ключом model: ответ другой модели (хедж, замена) под ним не запоминаем
+        return sanitize_html(finalized), answered == model
 
     async def simple_translate(self, text: str) -> str:
         """Переводит произвольный текст на русский. Возвращает исходный текст при ошибке."""
@@ -65,29 +333,35 @@ class AIProcessor:
                 "Переведи текст на литературный русский. Сохрани смысл, имена собственные и форматирование HTML. "
                 "Отвечай ТОЛЬКО переведенным русским текстом без добавлений, без хештегов.\n\n{}"
             ).format(text)
-            rsp = await g4f.ChatCompletion.create_async(
+            rsp, _ = await complete(
                 model=self._SAFE_MODEL,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                timeout=20
             )
             return rsp
         except Exception:
             return text
 
-    async def _call_llm(self, model: str, sys: str, user: str) -> str:
-        return await asyncio.wait_for(g4f.ChatCompletion.create_async(model=model,
-                                                                      messages=[{"role": "system", "content": sys},
-                                                                                {"role": "user", "content": user}]),
-                                      timeout=20)
+    async def _call_llm(self, model: str, sys: str, user: str, timeout: float = 20,
+                        size: int = 1) -> Tuple[str, str]:
+        return await complete(model, [{"role": "system", "content": sys},
+                                      {"role": "user", "content": user}], timeout=timeout, size=size)
 
-    async def _fallback_format(self, entry: Dict, topic: str) -> str:
+    async def _fallback_format(self, entry: Dict, topic: str, russian: bool = False) -> str:
+        if russian:
+            return self._local_format(entry['title'], entry['content'], topic)
         title_ru = await self.simple_translate(entry['title'])
         cont_ru = await self.simple_translate(entry['content'])
-        cont_ru = cont_ru.replace("\n\n", "\n")[:600]
+        return self._local_format(title_ru, cont_ru, topic)
+
+    def _local_format(self, title: str, content: str, topic: str) -> str:
+        """Оформление поста без LLM: заголовок, эмодзи темы и первые предложения текста."""
+        content = content.replace("\n\n", "\n")[:600]
         emoji = random.choice(self._emojis_for(topic))
-        body = ". ".join(cont_ru.split(". ")[:4])
+        body = ". ".join(content.split(". ")[:4])
         if body and not body.endswith("."):
             body += "."
-        clean_title = title_ru.strip(' "\'')
+        clean_title = title.strip(' "\'')
         return "<b>{} {}</b>\n\n{}".format(emoji, clean_title, body)[:1000]
 
     def _finalize_post(self, raw: str, topic: str) -> str:
@@ -131,40 +405,35 @@ class AIProcessor:
         return txt[:1000]
 
     async def _ensure_russian(self, text: str) -> str:
-        """Гарантирует, что итоговый текст на русском. При необходимости выполняет повторный перевод."""
+        """Гарантирует, что итоговый текст на русском.
+
+        Перевод запрашивается, только если локальное определение языка уверенно говорит,
+        что текст не русский: короткие и смешанные тексты (названия продуктов, цифры) не трогаем.
+        """
         try:
-            def cyr_ratio(s: str) -> float:
-                letters = [c for c in s if c.isalpha()]
-                if not letters:
-                    return 0.0
-                cyr = sum(1 for c in letters if 'а' <= c.lower() <= 'я' or c.lower() == 'ё')
-                return cyr / max(1, len(letters))
-
-            ratio = cyr_ratio(text)
-            if ratio >= 0.7:
+            if not clearly_not_russian(text):
                 return text
 
-            # Первая попытка перевода
             translated = await self.simple_translate(text)
-            if cyr_ratio(translated) >= 0.7:
+            if not clearly_not_russian(translated):
                 return translated
 
-            # Вторая (последняя) попытка перевода, если все еще не хватает кириллицы
-            translated2 = await self.simple_translate(translated)
-            if cyr_ratio(translated2) >= 0.7:
-                return translated2
-
-            return translated2
+            # Вторая (последняя) попытка, если перевод все еще явно не на русском
+            return await self.simple_translate(translated)
         except Exception:
             return text
 
     def _emojis_for(self, topic: str) -> List[str]:
+        return self.emojis[self._topic_group(topic)]
+
+    @staticmethod
+    def _topic_group(topic: str) -> str:
         t = topic.lower()
         if any(w in t for w in ("it", "tech", "технолог", "программ", "код")):
-            return self.emojis["tech"]
+            return "tech"
         if any(w in t for w in ("бизнес", "финанс", "экономик", "маркет")):
-            return self.emojis["business"]
-        return self.emojis["news"]
+            return "business"
+        return "news"
 
     def _hashtags_for(self, topic: str) -> List[str]:
         # Поддерживаем метод для обратной совместимости, но больше не используем хештеги
@@ -183,3 +452,16 @@ class AIProcessor:
             "4. Стиль: без воды.\n"
             "5. НЕ используй хештеги вообще. Не добавляй их ни в конце, ни в тексте."
         )
+
+    @staticmethod
+    def _default_prompt_ru() -> str:
+        # Для русскоязычных источников: без перевода, только редактура
+        return (
+            "Ты — профессиональный редактор телеграм-канала на тему \"{topic}\". "
+            "Задача: сократи и отредактируй русскоязычную новость.\n\n"
+            "Правила:\n"
+            "1. Формат: жирный заголовок без кавычек + 2–3 абзаца, ≤900 символов. "
+            "Один из абзацев (самый важный) оформи как цитату, используя теги <i> и </i>.\n"
+            "2. Стиль: без воды.\n"
+            "3. НЕ используй хештеги."
+        )
@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config.settings import FEED_CACHE_TTL, FEED_CACHE_MAX_ENTRIES, FEED_CACHE_MAX_BYTES
+from utils.helpers import normalize_feed_url
+
+
+class FeedCache:
+    """Кэш разобранных лент в памяти: ключ — нормализованный URL, запись живет ttl секунд.
+
+    Ограничен и по числу лент, и по примерному объему текста; при переполнении
+    вытесняются давно не использованные ленты (LRU).
+    """
+
+    def __init__(self, ttl: int, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, url: str) -> Optional[List[Dict]]:
+        key = normalize_feed_url(url)
+        item = self._items.get(key)
+        if item is None:
+            return None
+        stored_at, entries, size = item
+        if time.monotonic() - stored_at > self.ttl:
+            self._drop(key)
+            return None
+        self._items.move_to_end(key)
+        return entries
+
+    def put(self, url: str, entries: List[Dict]) -> None:
+        key = normalize_feed_url(url)
+        if key in self._items:
+            self._drop(key)
+        size = self._estimate_size(entries)
+        if size > self.max_bytes:
+            return
+        self._items[key] = (time.monotonic(), entries, size)
+        self._bytes += size
+        while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._items)))
+
+    def touch(self, url: str) -> None:
+        """Продлевает свежесть ленты, которая подтверждена как неизменная (ответ 304)."""
+        key = normalize_feed_url(url)
+        item = self._items.get(key)
+        if item is not None:
+            self._items[key] = (time.monotonic(), item[1], item[2])
+            self._items.move_to_end(key)
+
+    def _drop(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    @staticmethod
+    def _estimate_size(entries: List[Dict]) -> int:
+        # Грубая оценка: текстовые поля плюс постоянные накладные расходы на словарь
+        return sum(len(e.get('content', '')) + len(e.get('title', '')) + len(e.get('link', '')) + 256
+                   for e in entries)
+
+
+feed_cache = FeedCache(FEED_CACHE_TTL, FEED_CACHE_MAX_ENTRIES, FEED_CACHE_MAX_BYTES)
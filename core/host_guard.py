@@ -0,0 +1,178 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from config.settings import HOST_RATE_PER_SEC, HOST_BURST, HOST_FAILURE_THRESHOLD, HOST_RESET_TIMEOUT
+
+
+class CircuitBreaker:
+    """Предохранитель: после failure_threshold ошибок подряд размыкается на reset_timeout секунд.
+
+    По истечении паузы пропускает один пробный запрос (half-open): успех замыкает цепь,
+    ошибка снова размыкает ее. Пауза может быть продлена явно (Retry-After).
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() >= self.open_until:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    @property
+    def probe_pending(self) -> bool:
+        """Пробный запрос пропущен, а его исход еще не записан."""
+        return self.state == self.HALF_OPEN and self._probe_in_flight
+
+    def abandon_probe(self) -> None:
+        """Пробный запрос отменен, не дав ответа: следующий allow() пропустит новый пробный."""
+        if self.probe_pending:
+            self.open_for(0)
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.open_for(self.reset_timeout)
+
+    def open_for(self, seconds: float) -> None:
+        self.state = self.OPEN
+        self.open_until = max(self.open_until, time.monotonic() + seconds)
+        self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        """Через сколько секунд предохранитель снова пропустит запрос."""
+        if self.state == self.OPEN:
+            return max(0.0, self.open_until - time.monotonic())
+        return 0.0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostUnavailable(Exception):
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(host)
+        self.host = host
+        self.retry_after = retry_after
+
+
+class HostGuard:
+    """Состояние по хостам-источникам, общее для всех циклов опроса.
+
+    Ограничивает темп запросов к каждому хосту (token bucket) и не ходит на хосты,
+    которые подряд падают или просят подождать (429/503 с Retry-After).
+    """
+
+    def __init__(self, rate: float = HOST_RATE_PER_SEC, burst: float = HOST_BURST,
+                 failure_threshold: int = HOST_FAILURE_THRESHOLD, reset_timeout: float = HOST_RESET_TIMEOUT):
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[host]
+
+    async def acquire(self, host: str) -> bool:
+        """Ждет своей очереди к хосту; HostUnavailable — если цепь разомкнута.
+
+        Возвращает True, если запрос пробный (half-open): вызывающий обязан записать его
+        исход или, если запрос не завершился, вызвать release_probe().
+        """
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            raise HostUnavailable(host, breaker.retry_in())
+        probe = breaker.state == CircuitBreaker.HALF_OPEN
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        try:
+            await self._buckets[host].acquire()
+        except BaseException:
+            if probe:
+                breaker.abandon_probe()
+            raise
+        return probe
+
+    def release_probe(self, host: str, failed: bool) -> None:
+        """Пробный запрос оборвался, не записав исход: ошибка — снова размыкаем, отмена — ждем новую пробу.
+
+        Иначе хост так и остался бы в half-open с «летящей» пробой и пропускался бы до перезапуска.
+        """
+        breaker = self.breaker(host)
+        if not breaker.probe_pending:
+            return
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.abandon_probe()
+
+    def record_success(self, host: str) -> None:
+        self.breaker(host).record_success()
+
+    def record_failure(self, host: str) -> None:
+        self.breaker(host).record_failure()
+
+    def record_throttled(self, host: str, retry_after: Optional[str]) -> float:
+        """Хост попросил притормозить: не ходим к нему Retry-After секунд (или reset_timeout)."""
+        delay = self._parse_retry_after(retry_after) or self.reset_timeout
+        self.breaker(host).open_for(delay)
+        return delay
+
+    def retry_in(self, host: str) -> float:
+        return self.breaker(host).retry_in()
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+host_guard = HostGuard()
@@ -0,0 +1,47 @@
+import aiohttp
+from typing import Optional
+
+from config.settings import HTTP_POOL_SIZE, HTTP_POOL_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT
+
+try:
+    # aiohttp сам распаковывает br, если установлен Brotli/brotlicffi
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Общая HTTP-сессия приложения (сборщик лент, публикатор, поиск RSS).
+
+    Один пул соединений с keep-alive и кэшем DNS вместо новой сессии на каждый
+    запрос. Создается лениво внутри event loop, закрывается в main.py при остановке.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_POOL_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers={'Accept-Encoding': ACCEPT_ENCODING},
+            auto_decompress=True,
+        )
+    return _session
+
+
+async def close_http_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
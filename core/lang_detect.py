@@ -0,0 +1,146 @@
+import re
+from collections import Counter
+from typing import Dict, Tuple
+
+# Определение языка текста без сети и моделей: сначала письменность (кириллица или латиница),
+# затем признаки языков — характерные буквы, служебные слова и буквенные триграммы.
+# Задача — надежно отличать русский от остальных, в том числе от других кириллических языков,
+# чтобы не гонять через LLM перевод того, что переводить не нужно.
+
+_WORD = re.compile(r"[^\W\d_]+")
+_TAG = re.compile(r"<[^>]+>")
+
+# Учитываются только отличительные признаки: общие для нескольких языков слова вроде
+# «на», «и», «за» ничего не говорят о языке и лишь размывают оценку.
+
+# Буквы, которые есть в алфавите только некоторых языков
+_LETTERS: Dict[str, str] = {
+    'ru': 'ыэё',
+    'uk': 'іїєґ',
+    'be': 'ўыэё',
+    'sr': 'ђјљњћџ',
+}
+
+# Буквы, которых в алфавите языка нет: каждая встреча — довод против
+_ABSENT: Dict[str, str] = {
+    'ru': 'іїєґўђјљњћџ',
+    'uk': 'ыэёъўђјљњћџ',
+    'be': 'ищъїєґђјљњћџ',
+    'bg': 'ыэёіїєґўђјљњћџ',
+    'sr': 'ыэёъщйіїєґўя',
+}
+
+# Частые буквы-маркеры: в тексте от MARKER_MIN_LETTERS букв их отсутствие почти исключает язык
+_FREQUENT_MARKERS: Dict[str, str] = {
+    'uk': 'іїє',
+    'be': 'ўі',
+    'sr': 'јљњћ',
+}
+MARKER_MIN_LETTERS = 40
+# Сколько очков признаков нужно для полной уверенности: один случайный признак — еще не вывод
+MIN_EVIDENCE = 4
+
+_STOPWORDS: Dict[str, set] = {
+    'ru': {'что', 'это', 'как', 'его', 'был', 'была', 'были', 'также', 'уже', 'который', 'которые', 'которая',
+           'только', 'она', 'они', 'так', 'из', 'для', 'после', 'будет', 'более', 'года', 'может', 'все', 'еще',
+           'или', 'при', 'если', 'чтобы', 'об', 'объявил', 'свой'},
+    'uk': {'що', 'це', 'та', 'від', 'які', 'який', 'яка', 'також', 'вже', 'або', 'після', 'щодо', 'через',
+           'було', 'буде', 'році', 'року', 'із', 'й'},
+    'be': {'што', 'гэта', 'таксама', 'быў', 'якія', 'які', 'ад', 'пасля', 'ужо', 'або', 'года'},
+    'bg': {'че', 'се', 'са', 'със', 'който', 'която', 'които', 'това', 'след', 'още', 'като', 'ще', 'беше',
+           'бяха', 'има', 'във', 'тази', 'този', 'тези', 'година'},
+    'sr': {'је', 'су', 'који', 'која', 'које', 'од', 'као', 'после', 'ће', 'био', 'била', 'године'},
+    'en': {'the', 'and', 'of', 'to', 'in', 'is', 'that', 'for', 'on', 'with', 'as', 'was', 'are', 'by', 'it',
+           'this', 'from', 'has', 'have', 'will', 'be'},
+    'de': {'der', 'die', 'und', 'das', 'ist', 'nicht', 'mit', 'den', 'von', 'für', 'auf', 'ein', 'eine', 'sich'},
+    'fr': {'le', 'la', 'les', 'et', 'des', 'est', 'une', 'du', 'pour', 'dans', 'que', 'qui', 'sur', 'pas'},
+    'es': {'el', 'los', 'las', 'y', 'del', 'es', 'por', 'una', 'para', 'con', 'se'},
+}
+
+# Отличительные окончания — буквенные триграммы с пробелом как границей слова
+_TRIGRAMS: Dict[str, set] = {
+    'ru': {'ый ', 'ых ', 'ой ', 'ии ', 'ую ', 'ому', 'ает', 'ует', 'ть '},
+    'uk': {'ння', 'ої ', 'ів ', 'ють', 'ськ', 'ає ', 'ься'},
+    'bg': {'ият', 'ът ', 'ите', 'ата', 'ото'},
+    'en': {'ing', 'ed ', 'ion'},
+}
+
+_CYRILLIC = ('ru', 'uk', 'be', 'bg', 'sr')
+_LATIN = ('en', 'de', 'fr', 'es')
+
+
+def _is_cyrillic(ch: str) -> bool:
+    return 'Ѐ' <= ch <= 'ӿ'
+
+
+def _scores(text: str) -> Counter:
+    """Очки языков-кандидатов; пустой Counter — текста слишком мало для вывода."""
+    text = _TAG.sub(' ', (text or '').lower())
+    words = _WORD.findall(text)
+    letters = sum(len(w) for w in words)
+    scores: Counter = Counter()
+    if letters < 12:
+        return scores
+
+    cyrillic = sum(1 for w in words for ch in w if _is_cyrillic(ch)) / letters
+    if cyrillic < 0.2:
+        candidates = _LATIN
+        # Латиница сама по себе довод: без узнаваемых слов это все равно не русский текст
+        scores['latin'] = MIN_EVIDENCE
+    elif cyrillic > 0.7:
+        candidates = _CYRILLIC
+    else:
+        # Смешанный текст (русский с английскими названиями и наоборот) — судим по признакам
+        candidates = _CYRILLIC + _LATIN
+
+    counts = Counter(words)
+    padded = ' ' + ' '.join(words) + ' '
+    grams = Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+    for lang in candidates:
+        for letter in _LETTERS.get(lang, ''):
+            scores[lang] += 3 * text.count(letter)
+        for letter in _ABSENT.get(lang, ''):
+            scores[lang] -= 3 * text.count(letter)
+        markers = _FREQUENT_MARKERS.get(lang)
+        if markers and letters >= MARKER_MIN_LETTERS and not any(m in text for m in markers):
+            scores[lang] -= 3
+        scores[lang] += 2 * sum(n for word, n in counts.items() if word in _STOPWORDS.get(lang, ()))
+        scores[lang] += sum(grams[g] for g in _TRIGRAMS.get(lang, ()))
+    return +scores
+
+
+def detect_language(text: str) -> Tuple[str, float]:
+    """Возвращает (код языка, уверенность 0..1). 'unknown' — текста слишком мало для вывода.
+
+    Коды: ru, uk, be, bg, sr — кириллица; en, de, fr, es — латиница; latin — латиница
+    без явных признаков одного из языков.
+    """
+    scores = _scores(text)
+    if len(scores) > 1:
+        scores.pop('latin', None)
+    ranked = scores.most_common(2)
+    if not ranked:
+        return 'unknown', 0.0
+    best, best_score = ranked[0]
+    second = ranked[1][1] if len(ranked) > 1 else 0
+    return best, (best_score - second) / max(best_score, MIN_EVIDENCE)
+
+
+def _russian_margin(text: str) -> float:
+    """Насколько русский опережает (>0) или отстает (<0) от лучшего из остальных языков, -1..1."""
+    scores = _scores(text)
+    if not scores:
+        return 0.0
+    ru = scores.pop('ru', 0)
+    other = max(scores.values(), default=0)
+    return (ru - other) / max(ru, other, MIN_EVIDENCE)
+
+
+def is_russian(text: str, min_confidence: float = 0.3) -> bool:
+    """Текст уверенно русский — перевод не нужен."""
+    return _russian_margin(text) >= min_confidence
+
+
+def clearly_not_russian(text: str, min_confidence: float = 0.5) -> bool:
+    """Текст уверенно нерусский — только тогда есть смысл просить перевод."""
+    return _russian_margin(text) <= -min_confidence
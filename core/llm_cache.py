@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import sqlite3
+import time
+from collections import Counter
+from typing import Optional
+
+from config.settings import LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class LLMCache:
+    """Постоянный кэш ответов LLM в локальном SQLite-файле.
+
+    Ключ — (модель, хеш системного промпта, хеш запроса). Записи старше ttl не отдаются
+    и удаляются; когда суммарный размер ответов превышает max_bytes, вытесняются давно
+    не использованные. Повторный запрос стоит чтения с диска вместо обращения к LLM.
+    """
+
+    # Как часто (в записях) проверять лимиты — чистка не нужна на каждую вставку
+    _EVICT_EVERY = 50
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: int = LLM_CACHE_TTL,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES, enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.stats: Counter = Counter()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._puts = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS llm_cache ('
+                ' model TEXT NOT NULL, system_hash TEXT NOT NULL, prompt_hash TEXT NOT NULL,'
+                ' response TEXT NOT NULL, size INTEGER NOT NULL,'
+                ' created_at REAL NOT NULL, last_used REAL NOT NULL,'
+                ' PRIMARY KEY (model, system_hash, prompt_hash))'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used)')
+        return self._conn
+
+    def get(self, model: str, system: str, prompt: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = (model, _digest(system), _digest(prompt))
+        try:
+            db = self._db()
+            row = db.execute(
+                'SELECT response, created_at FROM llm_cache WHERE model = ? AND system_hash = ? AND prompt_hash = ?',
+                key
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.stats['misses'] += 1
+                return None
+            db.execute(
+                'UPDATE llm_cache SET last_used = ? WHERE model = ? AND system_hash = ? AND prompt_hash = ?',
+                (time.time(), *key)
+            )
+        except sqlite3.Error as e:
+            logger.warning("Кэш LLM недоступен: %s", e)
+            return None
+        self.stats['hits'] += 1
+        return row[0]
+
+    def put(self, model: str, system: str, prompt: str, response: str) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            db = self._db()
+            db.execute(
+                'INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (model, _digest(system), _digest(prompt), response, len(response.encode()), now, now)
+            )
+            self._puts += 1
+            if self._puts % self._EVICT_EVERY == 1:
+                self.evict()
+        except sqlite3.Error as e:
+            logger.warning("Кэш LLM недоступен: %s", e)
+
+    def evict(self) -> None:
+        db = self._db()
+        expired = db.execute('DELETE FROM llm_cache WHERE created_at < ?', (time.time() - self.ttl,)).rowcount
+        self.stats['expired'] += max(expired, 0)
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Вытесняем самые давно использованные, пока не уложимся в лимит с запасом 10%
+        excess = total - int(self.max_bytes * 0.9)
+        evicted = 0
+        for rowid, size in db.execute('SELECT rowid, size FROM llm_cache ORDER BY last_used').fetchall():
+            if excess <= 0:
+                break
+            db.execute('DELETE FROM llm_cache WHERE rowid = ?', (rowid,))
+            excess -= size
+            evicted += 1
+        self.stats['evicted'] += evicted
+
+    def size(self) -> int:
+        if not self.enabled:
+            return 0
+        try:
+            return self._db().execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+llm_cache = LLMCache()
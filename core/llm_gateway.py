@@ -0,0 +1,317 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import (
+    AI_MODELS, AI_CONCURRENCY, LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_BUDGET, LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_DEFAULT_DELAY, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY, LLM_TARGET_LATENCY,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET
+)
+from core.host_guard import CircuitBreaker
+from core.llm_providers import LLMProvider, ModelNotFoundError, llm_provider
+
+logger = logging.getLogger(__name__)
+
+
+def _valid(response) -> bool:
+    return isinstance(response, str) and bool(response.strip())
+
+
+def batch_cost(size: int) -> float:
+    """Во сколько раз пакетный запрос из size записей дольше одиночного.
+
+    Каждая следующая запись пакета добавляет примерно половину одиночного запроса.
+    Задержки пакетов делятся на эту величину, прежде чем попасть в AIMD и в окна хеджирования.
+    """
+    return 1 + (max(1, size) - 1) / 2
+
+
+class LLMUnavailable(Exception):
+    """Предохранитель провайдера разомкнут: запрос не отправлялся."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("LLM недоступна, повтор через {:.0f} с".format(retry_after))
+        self.retry_after = retry_after
+
+
+class AdaptiveLimit:
+    """Предел одновременных запросов по схеме AIMD.
+
+    Ответ быстрее target_latency (для пакетных запросов — приведенной к одиночному
+    запросу, см. batch_cost) увеличивает предел на 1/limit (примерно +1 за «окно»
+    из limit запросов), ошибка, таймаут или медленный ответ уменьшают его вдвое — но не
+    чаще раза за target_latency, чтобы пачка одновременных ошибок не обрушила предел до минимума.
+    """
+
+    def __init__(self, initial: float, minimum: int, maximum: int, target_latency: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.inflight = 0
+        self._waiters: deque = deque()
+        self._decreased_at = 0.0
+
+    async def acquire(self) -> None:
+        while self.inflight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Нас уже разбудили — отдаем место следующему
+                    self._wake()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.inflight += 1
+
+    def try_acquire(self) -> bool:
+        """Занимает место, только если оно свободно сейчас и его никто не ждет."""
+        if self.inflight >= int(self.limit) or self._waiters:
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self._wake()
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self._decrease()
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_failure(self) -> None:
+        self._decrease()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._decreased_at < self.target_latency:
+            return
+        self._decreased_at = now
+        self.limit = max(float(self.minimum), self.limit / 2)
+
+    def _wake(self) -> None:
+        free = int(self.limit) - self.inflight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class LLMGateway:
+    """Единая точка запросов к провайдеру LLM с хеджированием медленных ответов.
+
+    Если основная модель не ответила за перцентиль percentile своих недавних задержек,
+    тот же запрос параллельно уходит другой модели из AI_MODELS. Побеждает первый
+    непустой ответ, остальной запрос отменяется. Хеджирование оплачивается кредитами:
+    каждый запрос добавляет budget кредита, дополнительный — тратит один, так что
+    дополнительных запросов не больше доли budget от основных.
+
+    Число одновременных запросов, включая дополнительные, ограничивает AdaptiveLimit;
+    timeout запроса отсчитывается с момента, когда ему досталось место. После failure_threshold
+    ошибок подряд предохранитель размыкается: complete() сразу бросает LLMUnavailable,
+    и вызывающий оформляет пост без LLM; через reset_timeout один пробный запрос
+    проверяет, ожил ли провайдер, а остальные в это время ждут его исхода.
+    """
+
+    # Сколько последних задержек модели помнить и сколько нужно, чтобы им доверять
+    _LATENCY_WINDOW = 200
+    _MIN_SAMPLES = 10
+    # Запас кредитов: после тихого периода можно подстраховать небольшую серию медленных запросов
+    _MAX_CREDITS = 5.0
+
+    def __init__(self, provider: LLMProvider = llm_provider, models: List[str] = AI_MODELS,
+                 enabled: bool = LLM_HEDGE_ENABLED, percentile: float = LLM_HEDGE_PERCENTILE,
+                 budget: float = LLM_HEDGE_BUDGET, min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 default_delay: float = LLM_HEDGE_DEFAULT_DELAY, limit: Optional[AdaptiveLimit] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.provider = provider
+        self.models = list(models)
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.limit = limit or AdaptiveLimit(AI_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY,
+                                            LLM_TARGET_LATENCY)
+        self.breaker = breaker or CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+        self.stats: Counter = Counter()
+        self._latencies: Dict[str, deque] = {}
+        self._credits = 0.0
+        self._probe: Optional[asyncio.Future] = None
+
+    async def complete(self, model: str, messages: List[Dict], timeout: Optional[float] = None,
+                       size: int = 1) -> Tuple[str, str]:
+        """Ответ и модель, которая его дала (при хеджировании это может быть не model).
+
+        size — сколько записей в запросе: задержка пакета сравнивается с одиночными по batch_cost.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        while not self.breaker.allow():
+            if self._probe is None or self._probe.done():
+                self.stats['rejected'] += 1
+                raise LLMUnavailable(self.breaker.retry_in())
+            # Идет пробный запрос: ждем его исхода, а не оформляем пост без LLM сразу
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait({self._probe}, timeout=remaining)
+            if not done:
+                self.stats['rejected'] += 1
+                raise LLMUnavailable(self.breaker.retry_in())
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if probe:
+            self._probe = asyncio.get_running_loop().create_future()
+        try:
+            return await self._guarded(model, messages, timeout, probe, batch_cost(size))
+        finally:
+            if probe and not self._probe.done():
+                self._probe.set_result(None)
+
+    async def _guarded(self, model: str, messages: List[Dict], timeout: Optional[float], probe: bool,
+                       cost: float) -> Tuple[str, str]:
+        try:
+            # Очередь за местом — не время ответа провайдера: таймаут запроса пойдет от получения места
+            await self.limit.acquire()
+        except BaseException:
+            # Запрос так и не ушел — о здоровье провайдера он ничего не говорит
+            if probe:
+                self.breaker.open_for(0)
+            raise
+        if self.breaker.state == CircuitBreaker.OPEN and not probe:
+            # Пока ждали места, предохранитель разомкнулся — не добавляем нагрузки больному провайдеру
+            self.limit.release()
+            self.stats['rejected'] += 1
+            raise LLMUnavailable(self.breaker.retry_in())
+
+        started = time.monotonic()
+        deadline = started + timeout if timeout else None
+        try:
+            response, answered = await self._hedged(model, messages, deadline, cost)
+        except ModelNotFoundError:
+            # Ошибка запроса, а не провайдера
+            self.breaker.record_success()
+            raise
+        except asyncio.CancelledError:
+            if probe:
+                self.breaker.open_for(0)
+            raise
+        except Exception:
+            self._record_failure()
+            raise
+        finally:
+            self.limit.release()
+        if _valid(response):
+            self.breaker.record_success()
+            self.limit.on_success((time.monotonic() - started) / cost)
+        else:
+            self._record_failure()
+        return response, answered
+
+    def _record_failure(self) -> None:
+        was_open = self.breaker.state == CircuitBreaker.OPEN
+        self.breaker.record_failure()
+        self.limit.on_failure()
+        if not was_open and self.breaker.state == CircuitBreaker.OPEN:
+            self.stats['breaker_trips'] += 1
+            logger.warning("Провайдер LLM нездоров: запросы приостановлены на %.0f с, посты оформляются без LLM",
+                           self.breaker.retry_in())
+
+    async def _hedged(self, model: str, messages: List[Dict], deadline: Optional[float],
+                      cost: float) -> Tuple[str, str]:
+        self.stats['requests'] += 1
+        self._credits = min(self._credits + self.budget, self._MAX_CREDITS)
+        started = time.monotonic()
+
+        primary = asyncio.create_task(self._request(model, messages, deadline, cost))
+        tasks = {primary}
+        try:
+            delay = self.hedge_delay(model, cost)
+            if self.enabled and (deadline is None or time.monotonic() + delay < deadline):
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    hedge = self._start_hedge(model, messages, deadline, cost)
+                    if hedge is not None:
+                        tasks.add(hedge)
+            answer = await self._first_valid(primary, tasks)
+            if not primary.done():
+                # Основной запрос проиграл и будет отменен: его задержка не меньше прошедшего времени.
+                # Без этого в окне остались бы только быстрые ответы и порог хеджирования сползал бы вниз
+                self._observe(model, (time.monotonic() - started) / cost)
+            return answer
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def hedge_delay(self, model: str, cost: float = 1.0) -> float:
+        """Сколько ждать основную модель, прежде чем подстраховаться другой.
+
+        В окне хранятся задержки, приведенные к одиночному запросу, — для пакета порог умножается на cost.
+        """
+        window = self._latencies.get(model)
+        if not window or len(window) < self._MIN_SAMPLES:
+            return self.default_delay * cost
+        ordered = sorted(window)
+        observed = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+        return max(self.min_delay, observed) * cost
+
+    def _start_hedge(self, model: str, messages: List[Dict], deadline: Optional[float],
+                     cost: float) -> Optional[asyncio.Task]:
+        if self._credits < 1:
+            self.stats['budget_denied'] += 1
+            return None
+        # Дополнительный запрос — тоже нагрузка на провайдера: только на свободное место и без очереди
+        if not self.limit.try_acquire():
+            self.stats['hedge_limited'] += 1
+            return None
+        self._credits -= 1
+        alternate = next((m for m in self.models if m != model), model)
+        self.stats['hedged'] += 1
+        logger.debug("Модель %s отвечает медленно, дублируем запрос в %s", model, alternate)
+        hedge = asyncio.create_task(self._request(alternate, messages, deadline, cost))
+        hedge.add_done_callback(lambda _: self.limit.release())
+        return hedge
+
+    async def _first_valid(self, primary: asyncio.Task, tasks: set) -> Tuple[str, str]:
+        pending = set(tasks)
+        last_answer = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    continue
+                answer = task.result()
+                if _valid(answer[0]):
+                    if task is not primary:
+                        self.stats['hedge_won'] += 1
+                    return answer
+                last_answer = answer
+        # Ни одного годного ответа: отдаем ошибку основного запроса, как без хеджирования
+        if primary.exception() is not None:
+            raise primary.exception()
+        return last_answer
+
+    async def _request(self, model: str, messages: List[Dict], deadline: Optional[float],
+                       cost: float) -> Tuple[str, str]:
+        started = time.monotonic()
+        timeout = None if deadline is None else max(0.001, deadline - started)
+        response = await self.provider.create(model, messages, timeout=timeout)
+        if _valid(response):
+            self._observe(model, (time.monotonic() - started) / cost)
+        return response, model
+
+    def _observe(self, model: str, latency: float) -> None:
+        window = self._latencies.get(model)
+        if window is None:
+            window = self._latencies[model] = deque(maxlen=self._LATENCY_WINDOW)
+        window.append(latency)
+
+
+llm_gateway = LLMGateway()
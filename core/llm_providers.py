@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from config.settings import (
+    LLM_PROVIDER, LLM_API_BASE, LLM_API_KEY, LLM_STUB_LATENCY, LLM_STUB_ERROR_RATE
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotFoundError(Exception):
+    """Провайдер не знает запрошенную модель — стоит повторить с другой."""
+
+
+class LLMProvider(ABC):
+    """Адаптер к источнику ответов LLM.
+
+    Наследники реализуют _create(); create() добавляет таймаут и ведет статистику
+    адаптера: число вызовов, ошибок, таймаутов и задержки последних успешных ответов.
+    """
+
+    name = 'base'
+    # Сколько последних задержек помнить для перцентилей
+    _LATENCY_WINDOW = 200
+
+    def __init__(self) -> None:
+        self.stats: Counter = Counter()
+        self._latencies: deque = deque(maxlen=self._LATENCY_WINDOW)
+
+    async def create(self, model: str, messages: List[Dict], timeout: Optional[float] = None) -> str:
+        self.stats['calls'] += 1
+        started = time.monotonic()
+        try:
+            request = self._create(model, messages)
+            response = await (asyncio.wait_for(request, timeout=timeout) if timeout else request)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+        except asyncio.CancelledError:
+            self.stats['cancelled'] += 1
+            raise
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        self._latencies.append(time.monotonic() - started)
+        return response
+
+    @abstractmethod
+    async def _create(self, model: str, messages: List[Dict]) -> str:
+        """Один запрос к источнику ответов; таймаут и статистику добавляет create()."""
+
+    def latency(self, percentile: float) -> Optional[float]:
+        """Задержка успешного ответа (сек) на перцентиле 0..1; None — ответов еще не было."""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+class G4FProvider(LLMProvider):
+    name = 'g4f'
+
+    def __init__(self) -> None:
+        super().__init__()
+        # g4f нужен только этому адаптеру: заглушка и OpenAI-совместимый сервер работают без него
+        import g4f
+        from g4f.errors import ModelNotFoundError as G4FModelNotFoundError
+        self._g4f = g4f
+        self._model_not_found = G4FModelNotFoundError
+
+    async def _create(self, model: str, messages: List[Dict]) -> str:
+        try:
+            return await self._g4f.ChatCompletion.create_async(model=model, messages=messages)
+        except self._model_not_found as e:
+            raise ModelNotFoundError(str(e)) from e
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Любой сервер с API /chat/completions: OpenAI, vLLM, llama.cpp, Ollama и т.п."""
+
+    name = 'openai'
+
+    def __init__(self, base_url: str = LLM_API_BASE, api_key: str = LLM_API_KEY) -> None:
+        super().__init__()
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.api_key = api_key
+
+    async def _create(self, model: str, messages: List[Dict]) -> str:
+        from core.http_client import get_http_session
+
+        headers = {'Authorization': 'Bearer {}'.format(self.api_key)} if self.api_key else {}
+        async with get_http_session().post(self.url, json={'model': model, 'messages': messages},
+                                           headers=headers) as response:
+            body = await response.text()
+            if response.status == 404 and 'model' in body:
+                raise ModelNotFoundError(body[:200])
+            if response.status >= 400:
+                raise RuntimeError('HTTP {}: {}'.format(response.status, body[:200]))
+        try:
+            return json.loads(body)['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise RuntimeError('Некорректный ответ {}: {}'.format(self.url, body[:200])) from e
+
+
+class StubProvider(LLMProvider):
+    """Детерминированная офлайн-заглушка для нагрузочных тестов и бенчмарков.
+
+    Задержка (в пределах 0.5–1.5 от latency), ошибка и текст ответа зависят только от
+    запроса, поэтому прогоны воспроизводимы. На пакетные запросы отвечает JSON-массивом.
+    """
+
+    name = 'stub'
+    _BATCH = re.compile(r'JSON-массивом из (\d+)')
+
+    def __init__(self, latency: float = LLM_STUB_LATENCY, error_rate: float = LLM_STUB_ERROR_RATE) -> None:
+        super().__init__()
+        self.delay = latency
+        self.error_rate = error_rate
+
+    async def _create(self, model: str, messages: List[Dict]) -> str:
+        digest = hashlib.sha256(json.dumps([model, messages], ensure_ascii=False).encode()).digest()
+        rnd = random.Random(digest)
+        await asyncio.sleep(self.delay * (0.5 + rnd.random()))
+        if rnd.random() < self.error_rate:
+            raise RuntimeError('stub: имитация ошибки провайдера')
+        batch = self._BATCH.search(messages[-1]['content'])
+        if batch:
+            return json.dumps([self._post(rnd) for _ in range(int(batch.group(1)))], ensure_ascii=False)
+        return self._post(rnd)
+
+    @staticmethod
+    def _post(rnd: random.Random) -> str:
+        number = rnd.randrange(10 ** 6)
+        return ("Тестовый пост {}\n"
+                "Заглушка LLM вернула этот текст вместо ответа модели. "
+                "<i>Важная мысль поста номер {}.</i>").format(number, number)
+
+
+PROVIDERS = {
+    'g4f': G4FProvider,
+    'openai': OpenAICompatibleProvider,
+    'stub': StubProvider,
+}
+
+
+def make_provider(name: str) -> LLMProvider:
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise ValueError("Неизвестный LLM_PROVIDER: {} (доступны: {})".format(name, ', '.join(PROVIDERS)))
+
+
+llm_provider = make_provider(LLM_PROVIDER)
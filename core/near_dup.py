@@ -0,0 +1,254 @@
+import re
+import struct
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from config.settings import NEAR_DUP_ENABLED, NEAR_DUP_THRESHOLD, SEEN_INDEX_REBUILD
+from database.models import Post
+
+# Параметры подписи зашиты в сохраненные Post.minhash: при их изменении или изменении признаков
+# увеличьте SIGNATURE_VERSION — устаревшие подписи пересчитаются при загрузке индекса канала
+SIGNATURE_VERSION = 2
+NUM_SLOTS = 64
+BANDS = 16
+ROWS = NUM_SLOTS // BANDS
+MIN_SHINGLES = 5
+TITLE_NUMBERS_SHARE = 1.0
+# Корзины, куда попала заметная часть канала, набраны частыми словами и ничего не различают
+MAX_BUCKET = 256
+DEDUP_WINDOW = timedelta(days=30)
+
+# Токен — число с дробной частью (92,1; 18.1) или слово
+_TOKEN = re.compile(r'(\d+(?:[.,]\d+)*)\w*|(\w+)', re.UNICODE)
+_SIGNATURE = struct.Struct(f'<{NUM_SLOTS}I')
+_MASK32 = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_MIX = 0x9E3779B97F4A7C15
+
+
+
+def shingles(title: str, text: str, max_chars: int = 1000) -> set:
+    """Признаки записи: «основы» слов — первые 5 букв, грубый стемминг для русского — и числа целиком.
+
+    Пересказы одной новости разными изданиями меняют порядок слов и словоформы,
+    поэтому биграммы и полные слова здесь только снижают сходство. Числа, наоборот,
+    отличают выпуски регулярной новости («курс на 5 мая — 92,1», «iOS 18.1»): без них
+    такие новости совпадают целиком. Поэтому числа заголовка вместе весят долю
+    TITLE_NUMBERS_SHARE от словесных признаков — иначе в длинном тексте их не заметно.
+    """
+    title = (title or '').lower()
+    words, numbers = set(), set()
+    for number, word in _TOKEN.findall(f"{title} {(text or '')[:max_chars].lower()}"):
+        if number:
+            numbers.add(number)
+        elif len(word) > 2:
+            words.add(word[:5])
+    title_numbers = {number for number, _ in _TOKEN.findall(title) if number}
+    if title_numbers:
+        weight = max(1, round(len(words) * TITLE_NUMBERS_SHARE / len(title_numbers)))
+        numbers.update(f"{number}#{i}" for number in title_numbers for i in range(1, weight))
+    return words | numbers
+
+
+def minhash_signature(title: str, text: str) -> Optional[bytes]:
+    """One-permutation MinHash: один хеш на признак, минимум в каждом из NUM_SLOTS слотов.
+
+    Пустые слоты заполняются значением ближайшего непустого справа (densification),
+    чтобы подписи коротких текстов оставались сравнимыми. None — текста слишком мало.
+    """
+    grams = shingles(title, text)
+    if len(grams) < MIN_SHINGLES:
+        return None
+    slots: List[Optional[int]] = [None] * NUM_SLOTS
+    for gram in grams:
+        data = gram.encode()
+        h = ((zlib.crc32(data) | zlib.crc32(data, 0x9747B28C) << 32) * _MIX) & _MASK64
+        slot = h >> 58
+        value = (h >> 26) & _MASK32
+        current = slots[slot]
+        if current is None or value < current:
+            slots[slot] = value
+    dense = list(slots)
+    for i in range(NUM_SLOTS):
+        if slots[i] is None:
+            distance = 1
+            while slots[(i + distance) % NUM_SLOTS] is None:
+                distance += 1
+            dense[i] = (slots[(i + distance) % NUM_SLOTS] + distance * 0x9E3779B1) & _MASK32
+    # Последний байт — версия подписи; подписи первой версии хранились без него
+    return _SIGNATURE.pack(*dense) + bytes([SIGNATURE_VERSION])
+
+
+def is_current_signature(signature: bytes) -> bool:
+    return len(signature) == _SIGNATURE.size + 1 and signature[-1] == SIGNATURE_VERSION
+
+
+def signature_value(signature: bytes) -> int:
+    """Подпись одним int: компактнее кортежа и сравнивается без цикла по слотам."""
+    return int.from_bytes(signature[:_SIGNATURE.size], 'little')
+
+
+def similarity(a: int, b: int) -> float:
+    """Оценка коэффициента Жаккара по доле совпавших слотов подписей (signature_value).
+
+    XOR обнуляет совпавшие 32-битные слоты, а распаковка и подсчет нулей идут в C —
+    втрое быстрее поэлементного сравнения в цикле Python.
+    """
+    return _SIGNATURE.unpack((a ^ b).to_bytes(_SIGNATURE.size, 'little')).count(0) / NUM_SLOTS
+
+
+class LSHIndex:
+    """LSH по полосам подписи: записи с похожестью выше ~(1/BANDS)^(1/ROWS) почти наверняка
+    попадают в общую корзину хотя бы одной полосы, остальные сравниваются только с кандидатами."""
+
+    def __init__(self):
+        # Корзина полосы: хеш полосы -> id поста или список id (одиночные корзины — большинство)
+        self.buckets: List[Dict[int, Union[int, List[int]]]] = [{} for _ in range(BANDS)]
+        self.signatures: Dict[int, Tuple[int, datetime]] = {}
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _bands(signature: bytes):
+        width = ROWS * 4
+        return (hash(signature[band * width:(band + 1) * width]) for band in range(BANDS))
+
+    def add(self, post_id: int, signature: bytes, when: datetime) -> None:
+        self.signatures[post_id] = (signature_value(signature), when)
+        for bucket, key in zip(self.buckets, self._bands(signature)):
+            current = bucket.get(key)
+            if current is None:
+                bucket[key] = post_id
+            elif isinstance(current, list):
+                current.append(post_id)
+            else:
+                bucket[key] = [current, post_id]
+
+    def query(self, signature: bytes, since: datetime, threshold: float) -> Optional[Tuple[int, float]]:
+        """Самый похожий пост окна с похожестью не ниже threshold: (post_id, похожесть)."""
+        candidates = set()
+        for bucket, key in zip(self.buckets, self._bands(signature)):
+            found = bucket.get(key)
+            if isinstance(found, list):
+                if len(found) <= MAX_BUCKET:
+                    candidates.update(found)
+            elif found is not None:
+                candidates.add(found)
+        values = signature_value(signature)
+        best = None
+        for post_id in candidates:
+            other, when = self.signatures[post_id]
+            if when < since:
+                continue
+            score = similarity(values, other)
+            if score >= threshold and (best is None or score > best[1]):
+                best = (post_id, score)
+        return best
+
+
+class NearDupDetector:
+    """Поиск почти-дубликатов среди постов канала за окно дедупликации.
+
+    Ловит одну и ту же новость из разных источников до вызова AI: индекс канала
+    строится из сохраненных подписей Post.minhash (при старте или лениво),
+    пополняется при создании постов и сбрасывается при их удалении.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, rebuild_after: int = SEEN_INDEX_REBUILD,
+                 enabled: bool = NEAR_DUP_ENABLED):
+        self.threshold = threshold
+        self.rebuild_after = rebuild_after
+        self.enabled = enabled
+        self._channels: Dict[int, LSHIndex] = {}
+        self.stats: Counter = Counter()
+
+    def _backfill(self, db: Session, since: datetime, channel_id: Optional[int] = None) -> None:
+        # Подписи постов, созданных до появления колонки minhash
+        query = db.query(Post).filter(Post.minhash.is_(None), Post.scheduled_time >= since)
+        if channel_id is not None:
+            query = query.filter(Post.channel_id == channel_id)
+        posts = query.all()
+        for post in posts:
+            post.minhash = minhash_signature(post.original_title, post.original_content) or b''
+        if posts:
+            db.commit()
+
+    def _load(self, db: Session, channel_id: Optional[int] = None) -> Dict[int, LSHIndex]:
+        since = datetime.utcnow() - DEDUP_WINDOW
+        self._backfill(db, since, channel_id)
+        query = db.query(Post.id, Post.channel_id, Post.minhash, Post.scheduled_time).filter(
+            Post.scheduled_time >= since, Post.minhash.isnot(None)
+        )
+        if channel_id is not None:
+            query = query.filter(Post.channel_id == channel_id)
+        indexes: Dict[int, LSHIndex] = {}
+        if channel_id is not None:
+            indexes[channel_id] = LSHIndex()
+        stale = []
+        for row in query:
+            if row.minhash and not is_current_signature(row.minhash):
+                stale.append(row.id)
+            elif row.minhash:
+                indexes.setdefault(row.channel_id, LSHIndex()).add(row.id, row.minhash, row.scheduled_time)
+        for post in self._resign(db, stale):
+            if post.minhash:
+                indexes.setdefault(post.channel_id, LSHIndex()).add(post.id, post.minhash, post.scheduled_time)
+        return indexes
+
+    @staticmethod
+    def _resign(db: Session, post_ids: List[int], batch_size: int = 500) -> List[Post]:
+        """Пересчитывает подписи, сохраненные прежней версией (см. SIGNATURE_VERSION)."""
+        posts = []
+        for start in range(0, len(post_ids), batch_size):
+            batch = db.query(Post).filter(Post.id.in_(post_ids[start:start + batch_size])).all()
+            for post in batch:
+                post.minhash = minhash_signature(post.original_title, post.original_content) or b''
+            db.commit()
+            posts.extend(batch)
+        return posts
+
+    def warm(self, db: Session) -> None:
+        if self.enabled:
+            self._channels = self._load(db)
+
+    def _channel(self, db: Session, channel_id: int) -> LSHIndex:
+        index = self._channels.get(channel_id)
+        if index is None or time.monotonic() - index.built_at > self.rebuild_after:
+            index = self._load(db, channel_id)[channel_id]
+            self._channels[channel_id] = index
+        return index
+
+    def filter_new(self, db: Session, channel_id: int, entries: List[Dict]) -> List[Dict]:
+        """Отбрасывает записи, похожие на посты канала или на более ранние записи той же пачки."""
+        if not self.enabled or not entries:
+            return entries
+        index = self._channel(db, channel_id)
+        batch = LSHIndex()
+        now = datetime.utcnow()
+        since = now - DEDUP_WINDOW
+        fresh = []
+        for position, entry in enumerate(entries):
+            signature = minhash_signature(entry.get('title'), entry.get('content'))
+            if signature is not None:
+                if index.query(signature, since, self.threshold) or batch.query(signature, since, self.threshold):
+                    self.stats['dropped'] += 1
+                    continue
+                batch.add(position, signature, now)
+            fresh.append(entry)
+        return fresh
+
+    def add(self, post: Post) -> None:
+        index = self._channels.get(post.channel_id)
+        if index is None or not post.minhash or post.scheduled_time is None:
+            return
+        index.add(post.id, post.minhash, post.scheduled_time)
+
+    def invalidate(self, channel_id: int) -> None:
+        self._channels.pop(channel_id, None)
+
+
+near_dup = NearDupDetector()
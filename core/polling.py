@@ -0,0 +1,40 @@
+import calendar
+import statistics
+from typing import Dict, List, Optional
+
+from config.settings import RSS_CHECK_INTERVAL, RSS_MIN_INTERVAL, RSS_MAX_INTERVAL
+
+
+def estimate_update_interval(entries: List[Dict]) -> Optional[float]:
+    """Оценивает, как часто лента публикует записи: медиана промежутков между датами записей (сек)."""
+    stamps = sorted(
+        calendar.timegm(entry['published']) for entry in entries if entry.get('published')
+    )
+    gaps = [b - a for a, b in zip(stamps, stamps[1:]) if b > a]
+    if not gaps:
+        return None
+    return statistics.median(gaps)
+
+
+def next_poll_interval(current: Optional[int], had_new: bool, update_interval: Optional[float] = None) -> int:
+    """Интервал до следующего опроса после успешной проверки.
+
+    Попадание (нашлись новые записи) сокращает интервал, промах — увеличивает.
+    Если по датам записей известен темп обновления ленты, интервал подтягивается
+    к половине этого темпа, чтобы не опаздывать больше чем на полпериода.
+    """
+    interval = current or RSS_CHECK_INTERVAL
+    interval = interval * (0.75 if had_new else 1.5)
+    if update_interval:
+        interval = (interval + update_interval / 2) / 2
+    return int(min(RSS_MAX_INTERVAL, max(RSS_MIN_INTERVAL, interval)))
+
+
+def backoff_interval(base: Optional[int], error_count: int) -> int:
+    """Экспоненциальная пауза после ошибок: выученный интервал удваивается на каждую подряд идущую ошибку.
+
+    Считается от base — интервала успешных опросов, — а не от предыдущей паузы:
+    пауза в сам интервал не записывается, и после восстановления ленту опрашивают в прежнем темпе.
+    """
+    interval = (base or RSS_CHECK_INTERVAL) * (2 ** min(error_count, 10))
+    return int(min(RSS_MAX_INTERVAL, max(RSS_MIN_INTERVAL, interval)))
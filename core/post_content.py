@@ -0,0 +1,40 @@
+from typing import Dict
+
+from sqlalchemy.orm.exc import ObjectDeletedError
+
+from core.ai_processor import AIProcessor
+from database.crud import fill_post_content
+
+# Что показывать вместо текста поста, который в ленивом режиме еще не сгенерирован
+PENDING_CONTENT = "⏳ Текст подготовит AI незадолго до публикации"
+
+
+def channel_ai_settings(channel) -> Dict:
+    """Настройки AI канала в том виде, в каком их принимает AIProcessor."""
+    return {
+        'ai_model': channel.ai_model,
+        'ai_prompt': channel.ai_prompt,
+        'topic': channel.topic
+    }
+
+
+def post_entry(post) -> Dict:
+    """Запись ленты, восстановленная из сохраненного поста (для генерации текста в ленивом режиме)."""
+    return {
+        'title': post.original_title or '',
+        'content': post.original_content or '',
+        'guid': post.guid
+    }
+
+
+async def ensure_post_content(db, post, processor: AIProcessor) -> str:
+    """Текст поста; если он еще не сгенерирован (ленивый режим), генерирует его сейчас."""
+    if post.processed_content:
+        return post.processed_content
+    content = await processor.process_content(post_entry(post), channel_ai_settings(post.channel))
+    fill_post_content(db, post.id, content)
+    try:
+        # Пока шла генерация, текст могли задать вручную — тогда в силе он
+        return post.processed_content or content
+    except ObjectDeletedError:
+        return content
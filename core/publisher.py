@@ -7,6 +7,8 @@ from aiogram import Bot
 from aiogram.types import BufferedInputFile
 from PIL import Image
 
+from core.http_client import get_http_session
+
 _MAX_IMG_SIZE = 8000000
 _PLACEHOLDER_IMG = "https://source.unsplash.com/1280x720/?news,technology"
 
@@ -14,7 +16,6 @@ _PLACEHOLDER_IMG = "https://source.unsplash.com/1280x720/?news,technology"
 class Publisher:
     def __init__(self, bot: Bot):
         self.bot = bot
-        self._http: Optional[aiohttp.ClientSession] = None
 
     async def publish_post(self, channel_id: str, content: str, media_urls: List[str] | None = None) -> Optional[int]:
         try:
@@ -70,10 +71,8 @@ class Publisher:
             return None
 
     async def _download_image(self, url: str) -> Optional[bytes]:
-        if self._http is None:
-            self._http = aiohttp.ClientSession()
         try:
-            async with self._http.get(url, timeout=aiohttp.ClientTimeout(total=10)) as r:
+            async with get_http_session().get(url, timeout=aiohttp.ClientTimeout(total=10)) as r:
                 if r.status != 200:
                     return None
                 data = await r.read()
@@ -96,7 +95,3 @@ class Publisher:
             return out.getvalue()
         except Exception:
             return data
-
-    async def __aexit__(self, *exc):
-        if self._http:
-            await self._http.close()
@@ -1,11 +1,13 @@
 import asyncio
 import aiohttp
 from bs4 import BeautifulSoup
-import feedparser
-import g4f
 from typing import List, Dict
 from urllib.parse import urljoin, urlparse, quote_plus
 
+from core.ai_processor import complete
+from core.http_client import get_http_session
+from core.rss_parser import load_feed
+
 
 class RSSFinder:
     def __init__(self):
@@ -18,22 +20,22 @@ class RSSFinder:
         search_queries = await self.generate_search_keywords(topic)
 
         sites = set()
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            for query in search_queries:
-                try:
-                    url = self.search_url.format(quote_plus(query))
-                    async with session.get(url, timeout=10) as response:
-                        html = await response.text()
-                        soup = BeautifulSoup(html, 'html.parser')
+        session = get_http_session()
+        for query in search_queries:
+            try:
+                url = self.search_url.format(quote_plus(query))
+                async with session.get(url, headers=self.headers, timeout=10) as response:
+                    html = await response.text()
+                    soup = BeautifulSoup(html, 'html.parser')
 
-                        for link in soup.select('a.result__a'):
-                            href = link.get('href')
-                            if href and href.startswith('http'):
-                                domain = urlparse(href).netloc
-                                if domain:
-                                    sites.add(f"https://{domain}")
-                except Exception:
-                    continue
+                    for link in soup.select('a.result__a'):
+                        href = link.get('href')
+                        if href and href.startswith('http'):
+                            domain = urlparse(href).netloc
+                            if domain:
+                                sites.add(f"https://{domain}")
+            except Exception:
+                continue
 
         if not sites:
             return []
@@ -45,7 +47,7 @@ class RSSFinder:
     async def generate_search_keywords(self, topic: str) -> List[str]:
         prompt = f"Generate 3 diverse search queries to find RSS feeds for the topic '{topic}'. Return only the queries, one per line."
         try:
-            response = await g4f.ChatCompletion.create_async(
+            response, _ = await complete(
                 model="gpt-4o-mini",
                 messages=[{"role": "user", "content": prompt}]
             )
@@ -56,17 +58,17 @@ class RSSFinder:
 
     async def discover_rss_feeds(self, sites: List[str]) -> List[Dict]:
         feeds = []
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            tasks = [self.fetch_site_feeds(site, session) for site in sites]
-            results = await asyncio.gather(*tasks)
-            for site_feeds in results:
-                feeds.extend(site_feeds)
+        session = get_http_session()
+        tasks = [self.fetch_site_feeds(site, session) for site in sites]
+        results = await asyncio.gather(*tasks)
+        for site_feeds in results:
+            feeds.extend(site_feeds)
         return list({feed['url']: feed for feed in feeds}.values())
 
     async def fetch_site_feeds(self, site_url: str, session: aiohttp.ClientSession) -> List[Dict]:
         found_feeds = []
         try:
-            async with session.get(site_url, timeout=7) as response:
+            async with session.get(site_url, headers=self.headers, timeout=7) as response:
                 html = await response.text()
                 soup = BeautifulSoup(html, 'lxml')
 
@@ -89,13 +91,10 @@ class RSSFinder:
                 validated.append(result)
         return validated
 
-    async def parse_and_validate(self, feed: Dict) -> Dict | None:
-        try:
-            parsed = feedparser.parse(feed['url'])
-            if parsed and parsed.entries:
-                feed['title'] = parsed.feed.get('title', feed['title'])
-                feed['entry_count'] = len(parsed.entries)
-                return feed
-        except Exception:
-            return None
+    async def parse_and_validate(self, feed: Dict, session: aiohttp.ClientSession | None = None) -> Dict | None:
+        parsed = await load_feed(feed['url'], session=session)
+        if parsed and parsed['entries']:
+            feed['title'] = parsed['title'] or feed['title']
+            feed['entry_count'] = len(parsed['entries'])
+            return feed
         return None
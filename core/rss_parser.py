@@ -1,10 +1,253 @@
 import feedparser
 import asyncio
 import aiohttp
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
 import hashlib
+from collections import Counter
+
+from config.settings import RSS_PARSE_EXECUTOR, RSS_PARSE_WORKERS, RSS_FETCH_TIMEOUT, RSS_MAX_FEED_BYTES
+from utils.helpers import extract_text_and_images, extract_domain
+from core.http_client import ACCEPT_ENCODING, get_http_session
+from core.feed_cache import feed_cache
+from core.host_guard import host_guard, HostUnavailable
+
+logger = logging.getLogger(__name__)
+
+_MAX_FEED_ENTRIES = 20
+
+# Добавляем заголовки для обхода Cloudflare
+_FEED_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
+class FeedTooLarge(Exception):
+    pass
+
+_parse_executor: Optional[Executor] = None
+
+# Сколько загрузок лент чем закончилось: fetched — всего ответов, not_modified — 304,
+# body_unchanged — то же тело, entries_unchanged — тот же список записей, parsed — полный разбор
+fetch_stats: Counter = Counter()
+
+
+def get_parse_executor() -> Optional[Executor]:
+    """Пул для разбора лент вне event loop (общий на процесс, создается лениво).
+
+    RSS_PARSE_EXECUTOR: process — пул процессов (по умолчанию), thread — пул потоков,
+    inline — разбирать прямо в loop (для отладки).
+    """
+    global _parse_executor
+    if _parse_executor is None and RSS_PARSE_EXECUTOR != 'inline':
+        workers = RSS_PARSE_WORKERS or os.cpu_count() or 1
+        if RSS_PARSE_EXECUTOR == 'thread':
+            _parse_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rss-parse')
+        else:
+            _parse_executor = ProcessPoolExecutor(max_workers=workers)
+    return _parse_executor
+
+
+def shutdown_parse_executor() -> None:
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+
+
+def _reset_parse_executor(broken: Executor) -> None:
+    """Выбрасывает сломанный пул; следующий get_parse_executor() создаст новый."""
+    global _parse_executor
+    # Пул мог уже пересоздать другой разбор, упавший вместе с нашим
+    if _parse_executor is broken:
+        logger.warning("Пул разбора лент сломан (воркер завершился аварийно), пересоздаем")
+        broken.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+
+
+async def parse_feed_content(content, known_entries_hash: Optional[str] = None) -> Dict:
+    """Разбирает тело ленты в пуле воркеров и возвращает компактный документ (см. parse_feed_document).
+
+    Если воркер пула погиб (OOM, падение lxml), пул пересоздается и разбор повторяется один раз:
+    сбой инфраструктуры разбора не должен засчитываться ленте как ошибка. Повторное падение
+    на свежем пуле уже говорит о самой ленте, и BrokenProcessPool уходит вызывающему.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = get_parse_executor()
+        if executor is None:
+            return parse_feed_document(content, known_entries_hash=known_entries_hash)
+        try:
+            return await loop.run_in_executor(executor, parse_feed_document, content, _MAX_FEED_ENTRIES,
+                                              known_entries_hash)
+        except BrokenProcessPool:
+            _reset_parse_executor(executor)
+            if attempt:
+                raise
+
+
+async def download_feed(session: aiohttp.ClientSession, url: str, headers: Optional[Dict] = None,
+                        timeout: int = RSS_FETCH_TIMEOUT, max_bytes: int = RSS_MAX_FEED_BYTES):
+    """Асинхронно скачивает ленту. Возвращает (status, headers, body); body только для 200.
+
+    Тело читается кусками и обрывается с FeedTooLarge, если превышает max_bytes.
+    Запросы к хосту идут через host_guard: с ограничением темпа, а к хосту с разомкнутым
+    предохранителем запрос не отправляется вовсе (HostUnavailable).
+    """
+    host = extract_domain(url)
+    probe = await host_guard.acquire(host)
+    request_headers = dict(_FEED_HEADERS)
+    if headers:
+        request_headers.update(headers)
+    try:
+        async with session.get(url, headers=request_headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status in (429, 503):
+                host_guard.record_throttled(host, response.headers.get('Retry-After'))
+                return response.status, response.headers, None
+            if response.status >= 500:
+                host_guard.record_failure(host)
+            else:
+                host_guard.record_success(host)
+            if response.status != 200:
+                return response.status, response.headers, None
+            if response.content_length and response.content_length > max_bytes:
+                raise FeedTooLarge(url)
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                body.extend(chunk)
+                if len(body) > max_bytes:
+                    raise FeedTooLarge(url)
+            return response.status, response.headers, bytes(body)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        host_guard.record_failure(host)
+        raise
+    except BaseException as e:
+        # Пробный запрос, оборвавшийся до записи исхода, не должен навсегда оставить хост в half-open
+        if probe:
+            host_guard.release_probe(host, failed=not isinstance(e, asyncio.CancelledError))
+        raise
+
+
+async def load_feed(url: str, session: Optional[aiohttp.ClientSession] = None,
+                    timeout: int = RSS_FETCH_TIMEOUT, max_bytes: int = RSS_MAX_FEED_BYTES) -> Optional[Dict]:
+    """Единая точка загрузки ленты для бота и поиска: aiohttp + разбор в пуле.
+
+    Никогда не ходит в сеть синхронно. Возвращает документ {'title', 'entries'}
+    или None, если ленту не удалось скачать.
+    """
+    try:
+        status, _, body = await download_feed(session or get_http_session(), url,
+                                              timeout=timeout, max_bytes=max_bytes)
+        if body is None:
+            return None
+        return await parse_feed_content(body)
+    except Exception:
+        return None
+
+
+def parse_feed_document(content, limit: int = _MAX_FEED_ENTRIES, known_entries_hash: Optional[str] = None) -> Dict:
+    """CPU-часть разбора: feedparser + извлечение текста/картинок через lxml.
+
+    Выполняется в воркере, поэтому наружу отдаем только простые словари,
+    которые дешево передаются между процессами. Если отпечаток списка записей
+    совпал с known_entries_hash, извлечение HTML пропускается (entries_unchanged).
+    """
+    feed = feedparser.parse(content)
+    return _document_from_feed(feed, limit, known_entries_hash)
+
+
+def entries_fingerprint(entry_ids: List[str]) -> str:
+    return hashlib.sha1('\n'.join(entry_ids).encode('utf-8', 'replace')).hexdigest()
+
+
+def _document_from_feed(feed, limit: int = _MAX_FEED_ENTRIES, known_entries_hash: Optional[str] = None) -> Dict:
+    # rel="hub" / rel="self" нужны для подписки на push-обновления (WebSub)
+    links = {link.get('rel'): link.get('href') for link in feed.feed.get('links', []) if link.get('href')}
+    document = {'title': feed.feed.get('title', ''), 'entries': [],
+                'hub': links.get('hub'), 'self': links.get('self'), 'entries_unchanged': False}
+
+    top_entries = feed.entries[:limit]
+    document['entries_hash'] = entries_fingerprint([e.get('id', e.get('link', '')) for e in top_entries])
+    if known_entries_hash and document['entries_hash'] == known_entries_hash:
+        document['entries_unchanged'] = True
+        return document
+
+    for entry in top_entries:
+        parsed_entry = parse_entry(entry)
+        if parsed_entry:
+            document['entries'].append(parsed_entry)
+    return document
+
+
+def parse_entry(entry) -> Optional[Dict]:
+    try:
+        # HTML записи разбираем один раз: и текст, и картинки берем из одного дерева
+        html, from_content = _entry_html(entry)
+        content, body_images = extract_text_and_images(html)
+        media = extract_media(entry, body_images if from_content else [])
+        # Разрешаем посты без изображений: media может быть пустым списком
+        return {
+            'guid': entry.get('id', entry.get('link', '')),
+            'title': entry.get('title', 'No title'),
+            'link': entry.get('link', ''),
+            'content': content,
+            'media': media,
+            'published': entry.get('published_parsed', None),
+            'author': entry.get('author', ''),
+            'tags': [tag.term for tag in entry.get('tags', [])][:5]
+        }
+    except:
+        return None
+
+
+def _entry_html(entry):
+    """HTML тела записи и признак того, что он взят из content (только оттуда берем картинки)."""
+    if 'content' in entry:
+        return entry.content[0].value, True
+    if 'summary' in entry:
+        return entry.summary, False
+    if 'description' in entry:
+        return entry.description, False
+    return '', False
+
+
+def extract_content(entry) -> str:
+    return extract_text_and_images(_entry_html(entry)[0])[0]
+
+
+def extract_media(entry, body_images: Optional[List[str]] = None) -> List[str]:
+    media_urls = []
+
+    if 'enclosures' in entry:
+        for enclosure in entry.enclosures:
+            if enclosure.get('type', '').startswith('image'):
+                media_urls.append(enclosure.href)
+
+    if 'media_content' in entry:
+        for media in entry.media_content:
+            if media.get('type', '').startswith('image'):
+                media_urls.append(media['url'])
+
+    if 'media_thumbnail' in entry:
+        for thumb in entry.media_thumbnail:
+            if thumb.get('url'):
+                media_urls.append(thumb['url'])
+
+    if 'content' in entry and not media_urls:
+        if body_images is None:
+            body_images = extract_text_and_images(entry.content[0].value)[1]
+        media_urls.extend(body_images)
+
+    return list(dict.fromkeys(media_urls))[:1]
 
 
 class RSSParser:
@@ -12,125 +255,130 @@ class RSSParser:
         self.session = None
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        # Сессия общая на приложение и закрывается при остановке бота, а не здесь
+        self.session = get_http_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        self.session = None
 
     async def parse_feed(self, url: str, last_guid: Optional[str] = None) -> List[Dict]:
+        result = await self.fetch_feed(url, last_guid)
+        return result['entries']
+
+    async def parse_feed_cached(self, url: str) -> List[Dict]:
+        """Все свежие записи ленты: из кэша, если планировщик или бот недавно ее скачивали."""
+        entries = feed_cache.get(url)
+        if entries is None:
+            entries = await self.parse_feed(url)
+            if entries:
+                feed_cache.put(url, entries)
+        return entries
+
+    async def fetch_feed(self, url: str, last_guid: Optional[str] = None,
+                         etag: Optional[str] = None, last_modified: Optional[str] = None,
+                         body_hash: Optional[str] = None, entries_hash: Optional[str] = None) -> Dict:
+        """Загружает ленту с условным GET и отсечкой по отпечаткам содержимого.
+
+        Возвращает словарь: entries — новые записи (от новых к старым), not_modified —
+        лента не изменилась (304, то же тело или тот же список записей) и разбор пропущен,
+        etag/last_modified — валидаторы ответа, body_hash/entries_hash — отпечатки тела
+        и списка записей для следующего опроса, error — ленту не удалось получить,
+        deferred — хост просит подождать или временно отключен, через сколько секунд
+        повторить (это не ошибка ленты), hub/topic — WebSub-хаб ленты и ее канонический URL.
+        """
+        result = {'entries': [], 'not_modified': False, 'etag': None, 'last_modified': None, 'error': False,
+                  'deferred': None, 'hub': None, 'topic': None, 'body_hash': body_hash, 'entries_hash': entries_hash}
         try:
-            # Добавляем заголовки для обхода Cloudflare
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            }
-            
-            if self.session:
-                async with self.session.get(url, headers=headers, timeout=10) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        feed = feedparser.parse(content)
-                    else:
-                        # Fallback к обычному feedparser
-                        feed = feedparser.parse(url)
-            else:
-                # Fallback к обычному feedparser
-                feed = feedparser.parse(url)
-                
-            if not feed.entries:
-                return []
+            headers = {}
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+            session = self.session or get_http_session()
+            status, response_headers, content = await download_feed(session, url, headers)
+            if status == 304:
+                # Лента не менялась — не тратим время на feedparser, разбор HTML и дедупликацию
+                fetch_stats['fetched'] += 1
+                fetch_stats['not_modified'] += 1
+                result['not_modified'] = True
+                result['etag'] = response_headers.get('ETag') or etag
+                result['last_modified'] = response_headers.get('Last-Modified') or last_modified
+                return result
+            if status in (429, 503):
+                fetch_stats['throttled'] += 1
+                result['deferred'] = host_guard.retry_in(extract_domain(url))
+                return result
+            if content is None:
+                result['error'] = True
+                return result
+
+            fetch_stats['fetched'] += 1
+            result['etag'] = response_headers.get('ETag')
+            result['last_modified'] = response_headers.get('Last-Modified')
+
+            # Некоторые серверы игнорируют условный GET и каждый раз отдают те же байты
+            result['body_hash'] = hashlib.sha256(content).hexdigest()
+            if body_hash and result['body_hash'] == body_hash:
+                fetch_stats['body_unchanged'] += 1
+                result['not_modified'] = True
+                return result
+
+            # feedparser и разбор HTML — CPU-работа, уводим ее из event loop в пул
+            document = await parse_feed_content(content, entries_hash)
+            result['entries_hash'] = document['entries_hash']
+            result['hub'] = document['hub']
+            result['topic'] = document['self'] or url
+            if document['entries_unchanged']:
+                # Тело поменялось (например, lastBuildDate), а записи те же
+                fetch_stats['entries_unchanged'] += 1
+                result['not_modified'] = True
+                return result
+            fetch_stats['parsed'] += 1
 
             # По умолчанию ленты отсортированы от новых к старым
             # Нам нужны записи НОВЕЕ, чем last_guid. То есть все, что встречается ДО last_guid
-            collected: List[Dict] = []
-            for entry in feed.entries[:20]:
-                entry_id = entry.get('id', entry.get('link', ''))
-                if last_guid and entry_id == last_guid:
-                    # Дошли до последнего обработанного – дальше только старые, прекращаем
-                    break
-
-                parsed_entry = self.parse_entry(entry)
-                if parsed_entry:
-                    collected.append(parsed_entry)
+            collected = self.entries_after(document['entries'], last_guid)
 
             # Если last_guid отсутствует в ленте (устарел), всё равно публикуем немного новых записей
             # collected уже содержит верхние элементы (новые). Возвращаем как есть — от новых к старым.
-            return collected
+            result['entries'] = collected
+            return result
+        except HostUnavailable as e:
+            # Хост лежит или просил подождать: запрос не отправляли, ошибку источнику не засчитываем
+            fetch_stats['host_skipped'] += 1
+            result['deferred'] = e.retry_after
+            return result
         except Exception:
-            return []
+            result['error'] = True
+            return result
+
+    @staticmethod
+    def entries_after(entries: List[Dict], last_guid: Optional[str]) -> List[Dict]:
+        """Оставляет записи новее last_guid (список идет от новых к старым)."""
+        if not last_guid:
+            return entries
+        collected = []
+        for entry in entries:
+            if entry.get('guid') == last_guid:
+                break
+            collected.append(entry)
+        return collected
 
     def parse_entry(self, entry) -> Optional[Dict]:
-        try:
-            content = self.extract_content(entry)
-            media = self.extract_media(entry)
-            # Разрешаем посты без изображений: media может быть пустым списком
-            return {
-                'guid': entry.get('id', entry.get('link', '')),
-                'title': entry.get('title', 'No title'),
-                'link': entry.get('link', ''),
-                'content': content,
-                'media': media,
-                'published': entry.get('published_parsed', None),
-                'author': entry.get('author', ''),
-                'tags': [tag.term for tag in entry.get('tags', [])][:5]
-            }
-        except:
-            return None
+        return parse_entry(entry)
 
     def extract_content(self, entry) -> str:
-        content = ''
-
-        if 'content' in entry:
-            content = entry.content[0].value
-        elif 'summary' in entry:
-            content = entry.summary
-        elif 'description' in entry:
-            content = entry.description
-
-        soup = BeautifulSoup(content, 'html.parser')
-        text = soup.get_text(separator=' ', strip=True)
-        text = ' '.join(text.split())
-        return text[:2000]
+        return extract_content(entry)
 
     def extract_media(self, entry) -> List[str]:
-        media_urls = []
-
-        if 'enclosures' in entry:
-            for enclosure in entry.enclosures:
-                if enclosure.get('type', '').startswith('image'):
-                    media_urls.append(enclosure.href)
-
-        if 'media_content' in entry:
-            for media in entry.media_content:
-                if media.get('type', '').startswith('image'):
-                    media_urls.append(media['url'])
-
-        if 'media_thumbnail' in entry:
-            for thumb in entry.media_thumbnail:
-                if thumb.get('url'):
-                    media_urls.append(thumb['url'])
-
-        if 'content' in entry and not media_urls:
-            soup = BeautifulSoup(entry.content[0].value, 'html.parser')
-            for img in soup.find_all('img')[:3]:
-                src = img.get('src')
-                if src and src.startswith('http'):
-                    media_urls.append(src)
-
-        return list(dict.fromkeys(media_urls))[:1]
+        return extract_media(entry)
 
     async def download_image(self, url: str) -> Optional[bytes]:
-        if not self.session:
-            self.session = aiohttp.ClientSession()
-
+        session = self.session or get_http_session()
         try:
-            async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
                 if response.status == 200:
                     content = await response.read()
                     if len(content) < 5000000:
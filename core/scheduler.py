@@ -1,13 +1,26 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime, timedelta
-from typing import Dict, Callable
+from typing import Dict, Callable, List, Optional
 import asyncio
+import logging
+from config.settings import (
+    RSS_FETCH_CONCURRENCY, RSS_FETCH_PER_HOST, RSS_SCHEDULER_TICK, RSS_MAX_ERRORS, RSS_MIN_INTERVAL,
+    WEBSUB_ENABLED, WEBSUB_CALLBACK_URL, WEBSUB_RENEW_BEFORE, AI_LAZY_GENERATION, AI_LAZY_LEAD_TIME
+)
 from database.crud import *
 from database.models import SessionLocal, Post
-from core.rss_parser import RSSParser
+from utils.helpers import extract_domain, normalize_feed_url
+from core.rss_parser import RSSParser, parse_feed_content
+from core.feed_cache import feed_cache
+from core.polling import estimate_update_interval, next_poll_interval, backoff_interval
 from core.ai_processor import AIProcessor
+from core.ai_pool import AIWorkerPool
+from core.post_content import channel_ai_settings, ensure_post_content, post_entry
 from core.publisher import Publisher
+from core.websub import WebSubManager
+
+logger = logging.getLogger(__name__)
 
 
 class Scheduler:
@@ -16,13 +29,24 @@ class Scheduler:
         self.bot = bot
         self.publisher = Publisher(bot)
         self.ai_processor = AIProcessor()
+        self.ai_pool = AIWorkerPool(self.ai_processor)
+        self.websub = None
+        if WEBSUB_ENABLED and not WEBSUB_CALLBACK_URL:
+            # Без публичного адреса хаб не достучится до приемника — подписки только зря висели бы в ожидании
+            logger.warning("WEBSUB_ENABLED=true, но WEBSUB_CALLBACK_URL не задан: WebSub отключен, ленты опрашиваются")
+        elif WEBSUB_ENABLED:
+            self.websub = WebSubManager(self._on_websub_verified, self._on_websub_content)
+        # Посты, текст которых сейчас генерирует prepare_upcoming_posts: id поста -> задача генерации
+        self._preparing: Dict[int, asyncio.Future] = {}
 
     def start(self):
         self.scheduler.add_job(
             self.check_rss_sources,
-            IntervalTrigger(seconds=1800),
+            IntervalTrigger(seconds=RSS_SCHEDULER_TICK),
             id='rss_checker',
-            replace_existing=True
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
         )
 
         # Публикуем чаще, чтобы не копился лаг публикации, но всегда строго по очереди/времени
@@ -33,72 +57,309 @@ class Scheduler:
             replace_existing=True
         )
 
+        if AI_LAZY_GENERATION:
+            # Тексты постов готовим заранее, но не раньше чем за AI_LAZY_LEAD_TIME до публикации
+            self.scheduler.add_job(
+                self.prepare_upcoming_posts,
+                IntervalTrigger(seconds=60),
+                id='post_preparer',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1
+            )
+
         self.scheduler.start()
 
+    async def start_websub(self):
+        if not self.websub:
+            return
+        db = SessionLocal()
+        try:
+            # После перезапуска снова принимаем уведомления по уже оформленным подпискам
+            for topic in {s.websub_topic for s in get_active_sources(db) if s.websub_topic}:
+                self.websub.register_topic(topic)
+        finally:
+            db.close()
+        await self.websub.start()
+
+    async def stop_websub(self):
+        if self.websub:
+            await self.websub.stop()
+
     async def check_rss_sources(self):
         db = SessionLocal()
         try:
             sources = get_active_sources(db)
+            now = datetime.utcnow()
+
+            # Одна и та же лента может быть подключена к нескольким каналам:
+            # качаем и разбираем каждый URL один раз, а записи раздаем всем подпискам
+            groups: Dict[str, List] = {}
+            for source in sources:
+                groups.setdefault(normalize_feed_url(source.url), []).append(source)
+
+            # Ленты с действующей WebSub-подпиской приходят push-ом и из опроса исключаются
+            if self.websub:
+                push_groups = [group for group in groups.values() if self._push_active(group, now)]
+                self._renew_websub(push_groups, now)
+                groups = {url: group for url, group in groups.items() if not self._push_active(group, now)}
+
+            # У каждого источника свое расписание: опрашиваем только те ленты, которым пора
+            due_groups = {
+                url: group for url, group in groups.items()
+                if any(s.next_check_at is None or s.next_check_at <= now for s in group)
+            }
+            if not due_groups:
+                return
 
             parser = RSSParser()
             async with parser:
-                for source in sources:
-                    try:
-                        entries = await parser.parse_feed(source.url, source.last_guid)
-
-                        if entries:
-                            channel = source.channel
-                            added_posts = 0
-
-                            # Обрабатываем от старых к новым, чтобы очередь шла в правильном порядке
-                            for entry in reversed(entries):
-                                # Больше не требуем обязательного наличия медиа — посты без изображений тоже учитываем
-
-                                # Проверяем дубликаты перед обработкой
-                                if check_post_duplicate(db, channel.id, entry['title'], entry['content'], entry.get('guid')):
-                                    continue
-
-                                processed = await self.ai_processor.process_content(
-                                    entry,
-                                    {
-                                        'ai_model': channel.ai_model,
-                                        'ai_prompt': channel.ai_prompt,
-                                        'topic': channel.topic
-                                    }
-                                )
-
-                                last_post = db.query(Post).filter(
-                                    Post.channel_id == channel.id
-                                ).order_by(Post.scheduled_time.desc()).first()
-
-                                # Всегда добавляем в очередь и рассчитываем корректное будущее время
-                                if last_post and last_post.scheduled_time and last_post.scheduled_time > datetime.utcnow():
-                                    next_time = last_post.scheduled_time + timedelta(seconds=channel.post_interval)
-                                else:
-                                    next_time = datetime.utcnow() + timedelta(minutes=5)
-
-                                create_post(
-                                    db, channel.id, source.url,
-                                    entry['title'], entry['content'],
-                                    processed, entry.get('media', []),
-                                    next_time, entry.get('guid')
-                                )
-                                added_posts += 1
-
-                            # Обновляем last_guid только если добавили посты
-                            if added_posts > 0 and entries:
-                                # Сохраняем самый новый GUID как last_guid
-                                latest_guid = entries[0].get('guid') or entries[0].get('link') or None
-                                update_source_check(db, source.id, latest_guid)
-                            else:
-                                # Если не добавили постов, просто обновляем время проверки
-                                update_source_check(db, source.id)
-
-                    except Exception:
-                        update_source_check(db, source.id, error=True)
+                # Ленты качаем параллельно: общий семафор + семафор на хост,
+                # а результат каждой ленты обрабатываем сразу по мере готовности
+                global_limit = asyncio.Semaphore(RSS_FETCH_CONCURRENCY)
+                host_limits: Dict[str, asyncio.Semaphore] = {}
+                tasks = [
+                    asyncio.create_task(self._fetch_group(parser, url, group, global_limit, host_limits))
+                    for url, group in due_groups.items()
+                ]
+
+                # Обработка ленты (AI и постановка в очередь) идет задачей: пока одна лента
+                # ждет LLM, остальные уже скачаны и тоже отдают записи в пул AI
+                handlers = []
+                for next_done in asyncio.as_completed(tasks):
+                    group, result, failed = await next_done
+                    if not failed and result['deferred'] is not None:
+                        # Хост перегружен или недоступен: просто приходим позже, без бэкоффа источника
+                        postpone_source_check(db, [s.id for s in group], max(result['deferred'], RSS_MIN_INTERVAL))
+                        continue
+                    if not failed:
+                        # Делимся результатом с ручным созданием постов через кэш лент
+                        if result['not_modified']:
+                            feed_cache.touch(group[0].url)
+                        elif result['entries']:
+                            feed_cache.put(group[0].url, result['entries'])
+                    handlers.append(asyncio.create_task(
+                        self._handle_group_result([s.id for s in group], result, failed)
+                    ))
+
+                for outcome in await asyncio.gather(*handlers, return_exceptions=True):
+                    if isinstance(outcome, Exception):
+                        logger.error("Ошибка обработки ленты: %s", outcome, exc_info=outcome)
         finally:
             db.close()
 
+    async def _handle_group_result(self, source_ids: List[int], result: Optional[Dict], failed: bool):
+        # Ленты обрабатываются параллельно, и у каждой своя сессия: сбой flush или соединения
+        # в одной не переводит общую сессию в состояние ожидания отката для всех остальных
+        db = SessionLocal()
+        try:
+            sources = {s.id: s for s in db.query(RSSSource).filter(RSSSource.id.in_(source_ids))}
+            group = [sources[source_id] for source_id in source_ids if source_id in sources]
+            if group:
+                await self._apply_group_result(db, group, result, failed)
+        finally:
+            db.close()
+
+    async def _apply_group_result(self, db, group: List, result: Optional[Dict], failed: bool):
+        if failed:
+            had_new = False
+            errors = True
+            for source in group:
+                update_source_check(db, source.id, error=True)
+        elif result['not_modified']:
+            # 304 или то же содержимое: лента не менялась, разбор и дедупликация не нужны
+            had_new = False
+            errors = False
+            for source in group:
+                update_source_check(db, source.id, **self._validators(result))
+        else:
+            had_new, errors = await self._ingest_group(db, group, result['entries'], self._validators(result))
+            if self.websub and result['hub']:
+                self._websub_subscribe(db, group, result['hub'], result['topic'])
+
+        # Подстраиваем расписание: частые ленты опрашиваем чаще, тихие — реже,
+        # при ошибках — экспоненциальный бэкофф и автоприостановка после RSS_MAX_ERRORS
+        current = max((s.poll_interval or 0) for s in group) or None
+        if errors:
+            error_count = max(s.error_count or 0 for s in group)
+            interval = backoff_interval(current, error_count)
+            suspend = error_count >= RSS_MAX_ERRORS
+        else:
+            update_rate = estimate_update_interval(result['entries']) if not result['not_modified'] else None
+            interval = next_poll_interval(current, had_new, update_rate)
+            suspend = False
+        for source in group:
+            schedule_source_check(db, source.id, interval, suspend=suspend, backoff=errors)
+
+    @staticmethod
+    def _validators(result: Dict) -> Dict:
+        return {
+            'etag': result['etag'],
+            'last_modified': result['last_modified'],
+            'content_hash': result['body_hash'],
+            'entries_hash': result['entries_hash'],
+        }
+
+    async def _ingest_group(self, db, group: List, entries: List[Dict], validators: Optional[Dict] = None):
+        """Раздает записи ленты всем подпискам группы. Общий путь для опроса и WebSub-push.
+
+        Подписки обрабатываются параллельно, каждая в своей сессии: генерации всех каналов
+        сразу уходят в пул, а в очередь каждый канал ставит под своим channel_lock.
+        """
+        source_ids = [source.id for source in group]
+        # Пока идут подписки, соединение сессии группы не держим. После коммита объекты группы
+        # перечитаются из базы уже с тем, что записали сессии подписок
+        db.commit()
+        outcomes = await asyncio.gather(*(self._ingest_source(source_id, entries, validators) for source_id in source_ids))
+        had_new = any(new for new, _ in outcomes)
+        errors = any(error for _, error in outcomes)
+        return had_new, errors
+
+    async def _ingest_source(self, source_id: int, entries: List[Dict], validators: Optional[Dict]):
+        db = SessionLocal()
+        try:
+            source = db.query(RSSSource).filter(RSSSource.id == source_id).first()
+            if source is None:
+                return False, False
+            new_entries = []
+            try:
+                # У каждой подписки свой курсор last_guid
+                new_entries = RSSParser.entries_after(entries, source.last_guid)
+                await self._process_entries(db, source, new_entries)
+                update_source_check(db, source.id, **(validators or {}))
+                return bool(new_entries), False
+            except Exception:
+                logger.exception("Ошибка обработки записей источника %s", source.url)
+                db.rollback()
+                update_source_check(db, source_id, error=True)
+                return bool(new_entries), True
+        finally:
+            db.close()
+
+    @staticmethod
+    def _push_active(group: List, now: datetime) -> bool:
+        return all(s.websub_expires_at and s.websub_expires_at > now for s in group)
+
+    def _websub_subscribe(self, db, group: List, hub: str, topic: str):
+        if self.websub.is_pending(topic):
+            return
+        set_sources_websub(db, [s.id for s in group], hub, topic)
+        self.websub.subscribe_in_background(hub, topic)
+
+    def _renew_websub(self, push_groups: List[List], now: datetime):
+        renew_at = now + timedelta(seconds=WEBSUB_RENEW_BEFORE)
+        for group in push_groups:
+            source = group[0]
+            self.websub.register_topic(source.websub_topic)
+            if min(s.websub_expires_at for s in group) <= renew_at and not self.websub.is_pending(source.websub_topic):
+                self.websub.subscribe_in_background(source.websub_hub, source.websub_topic)
+
+    async def _on_websub_verified(self, topic: str, lease_seconds: Optional[int]):
+        db = SessionLocal()
+        try:
+            expires_at = datetime.utcnow() + timedelta(seconds=lease_seconds) if lease_seconds else None
+            update_websub_lease(db, topic, expires_at)
+        finally:
+            db.close()
+
+    async def _on_websub_content(self, topic: str, body: bytes):
+        document = await parse_feed_content(body)
+        if not document['entries']:
+            return
+        db = SessionLocal()
+        try:
+            sources = get_sources_by_websub_topic(db, topic)
+            if sources:
+                await self._ingest_group(db, sources, document['entries'])
+        finally:
+            db.close()
+
+    async def _fetch_group(self, parser: RSSParser, url: str, group: List, global_limit: asyncio.Semaphore,
+                           host_limits: Dict[str, asyncio.Semaphore]):
+        # Условный GET и сверка отпечатков возможны, только если все подписки видели одну и ту же версию ленты
+        def shared(attr):
+            values = {getattr(s, attr) for s in group}
+            return values.pop() if len(values) == 1 else None
+        host = extract_domain(url)
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(RSS_FETCH_PER_HOST))
+        try:
+            async with global_limit, host_limit:
+                result = await parser.fetch_feed(group[0].url, etag=shared('etag'),
+                                                 last_modified=shared('last_modified'),
+                                                 body_hash=shared('content_hash'),
+                                                 entries_hash=shared('entries_hash'))
+            return group, result, result['error']
+        except Exception:
+            return group, None, True
+
+    async def _process_entries(self, db, source, entries: List[Dict]):
+        if not entries:
+            update_source_check(db, source.id)
+            return
+
+        channel = source.channel
+        added_posts = 0
+
+        # Обрабатываем от старых к новым, чтобы очередь шла в правильном порядке.
+        # Больше не требуем обязательного наличия медиа — посты без изображений тоже учитываем.
+        # Дубликаты отсекаем до обработки, одной пачкой на всю ленту, и сразу отдаем все
+        # новые записи в пул AI — генерации идут параллельно, пачками по несколько записей на запрос.
+        # В ленивом режиме в очередь идет исходная запись, текст сгенерирует prepare_upcoming_posts
+        fresh = filter_new_entries(db, channel.id, list(reversed(entries)))
+        if AI_LAZY_GENERATION:
+            jobs = [(entry, None) for entry in fresh]
+        else:
+            jobs = list(zip(fresh, self.ai_pool.submit_many(fresh, channel_ai_settings(channel))))
+        channel_lock = self.ai_pool.channel_lock(channel.id)
+        # Пока ждем блокировку и AI, читающую транзакцию не держим открытой: параллельных сессий
+        # больше, чем соединений в пуле, а ожидание соединения блокирует весь цикл событий
+        db.commit()
+
+        try:
+            # В очередь канала ставим строго по порядку ленты и по одному источнику за раз
+            async with channel_lock:
+                # Пока мы ждали блокировку, такие же новости мог поставить другой источник канала.
+                # Под блокировкой посты канала добавляем только мы, так что одной сверки на пачку хватает.
+                # Генерации отсеянных записей не отменяем: они идут общими пачками с остальными
+                still_new = {id(entry) for entry in filter_new_entries(db, channel.id, fresh)}
+                for entry, job in jobs:
+                    if id(entry) not in still_new:
+                        continue
+                    if job is not None and not job.done():
+                        db.commit()
+                    processed = await job if job is not None else None
+
+                    last_post = db.query(Post).filter(
+                        Post.channel_id == channel.id
+                    ).order_by(Post.scheduled_time.desc()).first()
+
+                    # Всегда добавляем в очередь и рассчитываем корректное будущее время
+                    if last_post and last_post.scheduled_time and last_post.scheduled_time > datetime.utcnow():
+                        next_time = last_post.scheduled_time + timedelta(seconds=channel.post_interval)
+                    else:
+                        next_time = datetime.utcnow() + timedelta(minutes=5)
+
+                    create_post(
+                        db, channel.id, source.url,
+                        entry['title'], entry['content'],
+                        processed, entry.get('media', []),
+                        next_time, entry.get('guid')
+                    )
+                    added_posts += 1
+        finally:
+            for _, job in jobs:
+                if job is not None:
+                    job.cancel()
+
+        # Обновляем last_guid только если добавили посты
+        if added_posts > 0:
+            # Сохраняем самый новый GUID как last_guid
+            latest_guid = entries[0].get('guid') or entries[0].get('link') or None
+            update_source_check(db, source.id, latest_guid)
+        else:
+            # Если не добавили постов, просто обновляем время проверки
+            update_source_check(db, source.id)
+
     async def publish_scheduled_posts(self):
         db = SessionLocal()
         try:
@@ -113,6 +374,16 @@ class Scheduler:
             if not channel.is_active:
                 return
 
+            if not post.processed_content:
+                job = self._preparing.get(post.id)
+                if job is not None:
+                    # Текст уже генерирует prepare_upcoming_posts — дожидаемся его, а не запрашиваем LLM второй раз
+                    await asyncio.wait({job})
+                    if not job.cancelled() and job.exception() is None:
+                        fill_post_content(db, post.id, job.result())
+                # Ленивый режим: текст не успели подготовить заранее — генерируем перед публикацией
+                await ensure_post_content(db, post, self.ai_processor)
+
             if channel.moderation_mode:
                 update_post_status(db, post.id, "moderation")
                 return
@@ -131,5 +402,47 @@ class Scheduler:
         finally:
             db.close()
 
+    async def prepare_upcoming_posts(self):
+        """Ленивый режим: генерирует тексты постов, до публикации которых осталось меньше AI_LAZY_LEAD_TIME."""
+        by_channel: Dict[int, tuple] = {}
+        db = SessionLocal()
+        try:
+            posts = get_posts_awaiting_content(db, datetime.utcnow() + timedelta(seconds=AI_LAZY_LEAD_TIME))
+            for post in posts:
+                if post.id in self._preparing:
+                    continue  # текст еще генерирует публикация или прошлый прогон
+                _, items = by_channel.setdefault(post.channel_id, (channel_ai_settings(post.channel), []))
+                items.append((post.id, post_entry(post)))
+        finally:
+            db.close()
+
+        results = await asyncio.gather(
+            *(self._prepare_channel_posts(ch_settings, items) for ch_settings, items in by_channel.values()),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Ошибка подготовки постов: %s", result)
+
+    async def _prepare_channel_posts(self, ch_settings: Dict, items: List[tuple]):
+        # Записи канала уходят в пул одной пачкой — так же, как при обработке ленты
+        jobs = self.ai_pool.submit_many([entry for _, entry in items], ch_settings)
+        for (post_id, _), job in zip(items, jobs):
+            self._preparing[post_id] = job
+        # Своя сессия на канал: ошибка одного канала не ломает транзакцию остальных
+        db = SessionLocal()
+        try:
+            for (post_id, _), job in zip(items, jobs):
+                fill_post_content(db, post_id, await job)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+            for (post_id, _), job in zip(items, jobs):
+                if self._preparing.get(post_id) is job:
+                    del self._preparing[post_id]
+                job.cancel()
+
     def stop(self):
         self.scheduler.shutdown()
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from typing import Awaitable, Callable, Coroutine, Dict, Optional, Set, Tuple
+
+from aiohttp import web
+
+from config.settings import (
+    WEBSUB_CALLBACK_URL, WEBSUB_HOST, WEBSUB_PORT, WEBSUB_SECRET, WEBSUB_LEASE_SECONDS
+)
+from core.http_client import get_http_session
+
+logger = logging.getLogger(__name__)
+
+# (topic, lease_seconds или None при отписке)
+VerifiedCallback = Callable[[str, Optional[int]], Awaitable[None]]
+# (topic, тело ленты)
+ContentCallback = Callable[[str, bytes], Awaitable[None]]
+
+
+class WebSubManager:
+    """Подписчик WebSub и HTTP-приемник push-уведомлений от хабов.
+
+    Для каждого топика callback-адрес вида {callback_url}/websub/{token}, где token
+    и секрет подписи детерминированно выводятся из топика и WEBSUB_SECRET — после
+    перезапуска соответствие восстанавливается без хранения в БД.
+    """
+
+    # Сколько ждать подтверждения от хаба, прежде чем снова отправить запрос подписки
+    _PENDING_TTL = 600
+
+    def __init__(self, on_verified: VerifiedCallback, on_content: ContentCallback,
+                 callback_url: str = WEBSUB_CALLBACK_URL, secret: str = WEBSUB_SECRET):
+        self.on_verified = on_verified
+        self.on_content = on_content
+        self.callback_url = callback_url.rstrip('/')
+        self.secret = secret.encode()
+        self._topics: Dict[str, str] = {}
+        # token -> (mode, когда отправлен запрос)
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._runner: Optional[web.AppRunner] = None
+        # Фоновые запросы подписки и доставки: цикл событий держит на задачи только слабые ссылки
+        self._tasks: Set[asyncio.Task] = set()
+
+    def topic_token(self, topic: str) -> str:
+        return hmac.new(self.secret, b'token:' + topic.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def topic_secret(self, topic: str) -> str:
+        return hmac.new(self.secret, b'secret:' + topic.encode(), hashlib.sha256).hexdigest()
+
+    def register_topic(self, topic: str) -> None:
+        """Запоминает топик, чтобы принимать для него уведомления (например, после перезапуска)."""
+        self._topics[self.topic_token(topic)] = topic
+
+    def is_pending(self, topic: str) -> bool:
+        """Запрос подписки или отписки отправлен и ждет подтверждения хаба."""
+        pending = self._pending.get(self.topic_token(topic))
+        return pending is not None and time.monotonic() - pending[1] < self._PENDING_TTL
+
+    async def subscribe(self, hub: str, topic: str, lease_seconds: int = WEBSUB_LEASE_SECONDS) -> bool:
+        return await self._request_subscription(hub, topic, 'subscribe', lease_seconds)
+
+    def subscribe_in_background(self, hub: str, topic: str) -> asyncio.Task:
+        """subscribe() без ожидания: задача живет, пока не завершится, и отменяется в stop()."""
+        return self._spawn(self.subscribe(hub, topic))
+
+    async def unsubscribe(self, hub: str, topic: str) -> bool:
+        return await self._request_subscription(hub, topic, 'unsubscribe')
+
+    async def _request_subscription(self, hub: str, topic: str, mode: str, lease_seconds: int = None) -> bool:
+        token = self.topic_token(topic)
+        self._topics[token] = topic
+        self._pending[token] = (mode, time.monotonic())
+        data = {
+            'hub.mode': mode,
+            'hub.topic': topic,
+            'hub.callback': f"{self.callback_url}/websub/{token}",
+        }
+        if mode == 'subscribe':
+            data['hub.secret'] = self.topic_secret(topic)
+            if lease_seconds:
+                data['hub.lease_seconds'] = str(lease_seconds)
+        try:
+            async with get_http_session().post(hub, data=data, timeout=10) as response:
+                # Хаб подтверждает намерение асинхронно (202) или сразу (204)
+                if response.status in (202, 204):
+                    return True
+                logger.warning("WebSub %s отклонен хабом %s (%s): %s", mode, hub, response.status, topic)
+        except Exception as e:
+            logger.warning("WebSub %s: хаб %s недоступен: %s", mode, hub, e)
+        self._pending.pop(token, None)
+        return False
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/websub/{token}', self._handle_verify)
+        app.router.add_post('/websub/{token}', self._handle_content)
+        return app
+
+    async def start(self, host: str = WEBSUB_HOST, port: int = WEBSUB_PORT) -> None:
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info("WebSub-приемник слушает %s:%s", host, port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, coro: Coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _handle_verify(self, request: web.Request) -> web.Response:
+        token = request.match_info['token']
+        topic = self._topics.get(token)
+        mode = request.query.get('hub.mode')
+        challenge = request.query.get('hub.challenge')
+
+        if mode == 'denied':
+            logger.warning("WebSub: хаб отказал в подписке на %s: %s", topic, request.query.get('hub.reason'))
+            self._pending.pop(token, None)
+            if topic:
+                await self.on_verified(topic, None)
+            return web.Response(text='')
+
+        # Подтверждаем только то, что сами запрашивали, и только для своего топика
+        requested_mode = self._pending.get(token, (None, 0.0))[0]
+        if not topic or request.query.get('hub.topic') != topic or requested_mode != mode or not challenge:
+            return web.Response(status=404)
+
+        self._pending.pop(token, None)
+        if mode == 'subscribe':
+            lease = request.query.get('hub.lease_seconds')
+            await self.on_verified(topic, int(lease) if lease and lease.isdigit() else WEBSUB_LEASE_SECONDS)
+        else:
+            await self.on_verified(topic, None)
+        return web.Response(text=challenge)
+
+    async def _handle_content(self, request: web.Request) -> web.Response:
+        topic = self._topics.get(request.match_info['token'])
+        if not topic:
+            return web.Response(status=410)
+        body = await request.read()
+
+        if not self._signature_valid(topic, body, request.headers.get('X-Hub-Signature', '')):
+            # По спецификации отвечаем 2xx, но неподписанное содержимое игнорируем
+            logger.warning("WebSub: неверная подпись уведомления для %s", topic)
+            return web.Response(status=202)
+
+        # Хабу отвечаем сразу, обработка идет в фоне
+        self._spawn(self._deliver(topic, body))
+        return web.Response(status=202)
+
+    async def _deliver(self, topic: str, body: bytes) -> None:
+        try:
+            await self.on_content(topic, body)
+        except Exception:
+            logger.exception("WebSub: ошибка обработки уведомления для %s", topic)
+
+    def _signature_valid(self, topic: str, body: bytes, header: str) -> bool:
+        method, _, signature = header.partition('=')
+        if method not in ('sha1', 'sha256', 'sha384', 'sha512') or not signature:
+            return False
+        expected = hmac.new(self.topic_secret(topic).encode(), body, method).hexdigest()
+        return hmac.compare_digest(expected, signature)
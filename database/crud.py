@@ -1,7 +1,10 @@
 from sqlalchemy.orm import Session
 from database.models import User, Channel, RSSSource, Post, SessionLocal
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
+from utils.helpers import title_fingerprint, content_fingerprint
+from database.seen_index import seen_index, post_keys
+from core.near_dup import near_dup, minhash_signature
 
 
 def get_db():
@@ -65,11 +68,16 @@ def create_post(db: Session, channel_id: int, source_url: str, title: str, conte
         processed_content=processed,
         media_urls=media,
         scheduled_time=scheduled,
-        guid=guid
+        guid=guid,
+        title_hash=title_fingerprint(title),
+        content_hash=content_fingerprint(content),
+        minhash=minhash_signature(title, content) or b''
     )
     db.add(post)
     db.commit()
     db.refresh(post)
+    seen_index.add(post)
+    near_dup.add(post)
     return post
 
 
@@ -88,6 +96,15 @@ def get_channel_queue(db: Session, channel_id: int):
     ).order_by(Post.scheduled_time).all()
 
 
+def get_posts_awaiting_content(db: Session, until: datetime, limit: int = 100):
+    """Посты без готового текста (ленивый режим AI), которые публикуются не позже until."""
+    return db.query(Post).filter(
+        Post.status == "pending",
+        Post.processed_content.is_(None),
+        Post.scheduled_time <= until
+    ).order_by(Post.scheduled_time.asc()).limit(limit).all()
+
+
 def update_post_status(db: Session, post_id: int, status: str, message_id: int = None):
     post = db.query(Post).filter(Post.id == post_id).first()
     if post:
@@ -100,12 +117,22 @@ def update_post_status(db: Session, post_id: int, status: str, message_id: int =
     return post
 
 
-def update_source_check(db: Session, source_id: int, last_guid: str = None, error: bool = False):
+def update_source_check(db: Session, source_id: int, last_guid: str = None, error: bool = False,
+                        etag: str = None, last_modified: str = None,
+                        content_hash: str = None, entries_hash: str = None):
     source = db.query(RSSSource).filter(RSSSource.id == source_id).first()
     if source:
         source.last_checked = datetime.utcnow()
         if last_guid:
             source.last_guid = last_guid
+        if etag:
+            source.etag = etag
+        if last_modified:
+            source.last_modified = last_modified
+        if content_hash:
+            source.content_hash = content_hash
+        if entries_hash:
+            source.entries_hash = entries_hash
         if error:
             source.error_count += 1
         else:
@@ -114,6 +141,62 @@ def update_source_check(db: Session, source_id: int, last_guid: str = None, erro
     return source
 
 
+def schedule_source_check(db: Session, source_id: int, interval: int, suspend: bool = False,
+                          backoff: bool = False):
+    source = db.query(RSSSource).filter(RSSSource.id == source_id).first()
+    if source:
+        # Пауза после ошибок — разовая: выученный интервал опроса она не меняет
+        if not backoff:
+            source.poll_interval = interval
+        source.next_check_at = datetime.utcnow() + timedelta(seconds=interval)
+        if suspend:
+            source.is_active = False
+        db.commit()
+    return source
+
+
+def postpone_source_check(db: Session, source_ids: List[int], seconds: float):
+    """Переносит ближайшую проверку, не трогая выученный интервал и счетчик ошибок."""
+    db.query(RSSSource).filter(RSSSource.id.in_(source_ids)).update(
+        {RSSSource.next_check_at: datetime.utcnow() + timedelta(seconds=seconds)}, synchronize_session=False
+    )
+    db.commit()
+
+
+def set_sources_websub(db: Session, source_ids: List[int], hub: str, topic: str):
+    db.query(RSSSource).filter(RSSSource.id.in_(source_ids)).update(
+        {RSSSource.websub_hub: hub, RSSSource.websub_topic: topic}, synchronize_session=False
+    )
+    db.commit()
+
+
+def update_websub_lease(db: Session, topic: str, expires_at: Optional[datetime]):
+    db.query(RSSSource).filter(RSSSource.websub_topic == topic).update(
+        {RSSSource.websub_expires_at: expires_at}, synchronize_session=False
+    )
+    db.commit()
+
+
+def get_sources_by_websub_topic(db: Session, topic: str):
+    return db.query(RSSSource).filter(
+        RSSSource.websub_topic == topic,
+        RSSSource.is_active == True
+    ).all()
+
+
+def toggle_source_active(db: Session, source_id: int):
+    source = db.query(RSSSource).filter(RSSSource.id == source_id).first()
+    if source:
+        source.is_active = not source.is_active
+        if source.is_active:
+            # Возобновленный источник проверяем сразу и с чистой историей ошибок
+            source.error_count = 0
+            source.next_check_at = None
+            source.poll_interval = None
+        db.commit()
+    return source
+
+
 def toggle_channel_active(db: Session, channel_id: int):
     channel = db.query(Channel).filter(Channel.id == channel_id).first()
     if channel:
@@ -148,6 +231,8 @@ def delete_channel(db: Session, channel_id: int):
         db.query(RSSSource).filter(RSSSource.channel_id == channel_id).delete()
         db.delete(channel)
         db.commit()
+        seen_index.invalidate(channel_id)
+        near_dup.invalidate(channel_id)
         return True
     return False
 
@@ -164,6 +249,8 @@ def delete_post(db: Session, post_id: int):
     if post:
         db.delete(post)
         db.commit()
+        seen_index.invalidate(post.channel_id)
+        near_dup.invalidate(post.channel_id)
         return True
     return False
 
@@ -177,45 +264,77 @@ def update_post_content(db: Session, post_id: int, new_content: str):
     return None
 
 
+def fill_post_content(db: Session, post_id: int, content: str) -> bool:
+    """Сохраняет сгенерированный текст, если пост не удалили и текст не задали вручную, пока шла генерация."""
+    updated = db.query(Post).filter(
+        Post.id == post_id,
+        Post.processed_content.is_(None)
+    ).update({Post.processed_content: content})
+    db.commit()
+    return updated > 0
+
+
 def check_post_duplicate(db: Session, channel_id: int, title: str, content: str, guid: str = None) -> bool:
     """
-    Проверяет, был ли уже создан пост с похожим заголовком, содержимым или GUID
+    Проверяет, был ли уже создан пост с тем же GUID, заголовком или началом текста,
+    либо почти такой же пост (та же новость из другого источника, см. core/near_dup.py).
     """
-    # Ищем посты за последние 30 дней (увеличиваем период)
-    from datetime import datetime, timedelta
-    month_ago = datetime.utcnow() - timedelta(days=30)
-    
-    # Проверяем по GUID (самый надежный способ)
-    if guid:
-        existing_by_guid = db.query(Post).filter(
-            Post.channel_id == channel_id,
-            Post.guid == guid,
-            Post.scheduled_time >= month_ago
-        ).first()
-        
-        if existing_by_guid:
-            return True
-    
-    # Проверяем по заголовку (более строгое сравнение)
-    title_clean = title.strip()[:100]
-    existing_by_title = db.query(Post).filter(
-        Post.channel_id == channel_id,
-        Post.original_title == title_clean,
-        Post.scheduled_time >= month_ago
-    ).first()
-    
-    if existing_by_title:
-        return True
-    
-    # Проверяем по содержимому (первые 200 символов, более точное сравнение)
-    content_clean = content.strip()[:200]
-    existing_by_content = db.query(Post).filter(
+    return not filter_new_entries(db, channel_id, [{'title': title, 'content': content, 'guid': guid}])
+
+
+def filter_new_entries(db: Session, channel_id: int, entries: List[Dict]) -> List[Dict]:
+    """
+    Возвращает записи, которых еще нет в канале, в исходном порядке.
+
+    Повторы внутри самой пачки отсекаются (остается первая запись). Все, что может,
+    решает индекс в памяти; для остальных — по одному запросу guid IN (...),
+    title_hash IN (...) и content_hash IN (...) на всю пачку, независимо от ее размера.
+    В конце — отсев почти-дубликатов среди постов канала и внутри пачки.
+    """
+    candidates = []
+    batch_keys = set()
+    for entry in entries:
+        fingerprints = (
+            entry.get('guid') or None,
+            title_fingerprint(entry.get('title')),
+            content_fingerprint(entry.get('content')),
+        )
+        keys = post_keys(*fingerprints)
+        if batch_keys.intersection(keys):
+            continue
+        batch_keys.update(keys)
+
+        # Сначала индекс в памяти: в базу идем, только если он не может ответить сам
+        verdict = seen_index.is_duplicate(db, channel_id, *fingerprints)
+        if not verdict:
+            candidates.append((entry, fingerprints, verdict is None))
+
+    uncertain = [fingerprints for _, fingerprints, maybe in candidates if maybe]
+    if uncertain:
+        month_ago = datetime.utcnow() - timedelta(days=30)
+        known = [
+            _existing_values(db, channel_id, column, {fp[i] for fp in uncertain if fp[i]}, month_ago)
+            for i, column in enumerate((Post.guid, Post.title_hash, Post.content_hash))
+        ]
+        candidates = [
+            (entry, fingerprints, maybe) for entry, fingerprints, maybe in candidates
+            if not maybe or not any(value and value in known[i] for i, value in enumerate(fingerprints))
+        ]
+
+    # Та же новость из другого источника: пересказ с другим заголовком и GUID
+    return near_dup.filter_new(db, channel_id, [entry for entry, _, _ in candidates])
+
+
+def _existing_values(db: Session, channel_id: int, column, values: set, since: datetime) -> set:
+    if not values:
+        return set()
+    # channel_id = ? AND column IN (...) — поиск по составному индексу (channel_id, column)
+    rows = db.query(column).filter(
         Post.channel_id == channel_id,
-        Post.original_content.like(f"%{content_clean}%"),
-        Post.scheduled_time >= month_ago
-    ).first()
-    
-    return existing_by_content is not None
+        column.in_(values),
+        Post.scheduled_time >= since
+    ).all()
+    return {value for value, in rows}
 
 
 def check_guid_exists(db: Session, channel_id: int, guid: str) -> bool:
@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import (
+    create_engine, inspect, text, select, update, bindparam,
+    Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON, Index, LargeBinary
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
 from config.settings import DATABASE_URL, DEFAULT_AI_MODEL
+from utils.helpers import title_fingerprint, content_fingerprint
 import os
 
 Base = declarative_base()
@@ -59,6 +63,19 @@ class RSSSource(Base):
     last_checked = Column(DateTime)
     last_guid = Column(String)
     error_count = Column(Integer, default=0)
+    # Валидаторы последнего ответа для условного GET (If-None-Match / If-Modified-Since)
+    etag = Column(String)
+    last_modified = Column(String)
+    # Отпечатки тела ответа и списка ID записей — для лент, которые игнорируют условный GET
+    content_hash = Column(String)
+    entries_hash = Column(String)
+    # Адаптивное расписание опроса: текущий интервал (сек) и момент следующей проверки
+    poll_interval = Column(Integer)
+    next_check_at = Column(DateTime)
+    # WebSub: хаб, топик подписки и срок аренды; пока аренда действует, источник не опрашивается
+    websub_hub = Column(String)
+    websub_topic = Column(String)
+    websub_expires_at = Column(DateTime)
     channel = relationship("Channel", back_populates="rss_sources")
 
 
@@ -76,7 +93,74 @@ class Post(Base):
     published_time = Column(DateTime)
     message_id = Column(Integer)
     guid = Column(String)  # Добавляем GUID для лучшего отслеживания дубликатов
+    # Отпечатки нормализованного заголовка и начала текста: дедупликация по индексу вместо LIKE
+    title_hash = Column(String(40))
+    content_hash = Column(String(40))
+    # MinHash-подпись заголовка и текста для поиска почти-дубликатов (core/near_dup.py)
+    minhash = Column(LargeBinary)
     channel = relationship("Channel", back_populates="posts")
 
+    __table_args__ = (
+        Index('ix_posts_channel_guid', 'channel_id', 'guid'),
+        Index('ix_posts_channel_title_hash', 'channel_id', 'title_hash'),
+        Index('ix_posts_channel_content_hash', 'channel_id', 'content_hash'),
+    )
+
+
+def _ensure_columns() -> None:
+    """Добавляет в существующие таблицы колонки, появившиеся в моделях позже.
+
+    create_all создает только отсутствующие таблицы, поэтому для уже развернутых
+    баз новые nullable-колонки докидываем через ALTER TABLE.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+
+
+def _ensure_indexes() -> None:
+    """Создает объявленные в моделях индексы, которых еще нет в уже развернутой базе."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def _backfill_post_fingerprints(batch_size: int = 1000) -> None:
+    """Заполняет отпечатки у постов, созданных до появления колонок title_hash/content_hash."""
+    posts = Post.__table__
+    pending = (
+        select(posts.c.id, posts.c.original_title, posts.c.original_content)
+        .where(posts.c.title_hash.is_(None), posts.c.content_hash.is_(None))
+        .order_by(posts.c.id)
+    )
+    fill = (
+        update(posts)
+        .where(posts.c.id == bindparam('post_id'))
+        .values(title_hash=bindparam('title_fp'), content_hash=bindparam('content_fp'))
+    )
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(pending.where(posts.c.id > last_id).limit(batch_size)).all()
+            if not rows:
+                return
+            conn.execute(fill, [
+                {'post_id': row.id, 'title_fp': title_fingerprint(row.original_title),
+                 'content_fp': content_fingerprint(row.original_content)}
+                for row in rows
+            ])
+            last_id = rows[-1].id
+
 
 Base.metadata.create_all(engine)
+_ensure_columns()
+_ensure_indexes()
+_backfill_post_fingerprints()
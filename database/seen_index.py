@@ -0,0 +1,157 @@
+import hashlib
+import math
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from config.settings import SEEN_INDEX_ERROR_RATE, SEEN_INDEX_EXACT_SIZE, SEEN_INDEX_REBUILD
+from database.models import Post
+
+# Окно дедупликации, как в check_post_duplicate
+DEDUP_WINDOW = timedelta(days=30)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Двойное хеширование: k позиций из одного 128-битного дайджеста
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class _ChannelIndex:
+    """Bloom-фильтр по всем ключам окна плюс точный LRU ключ -> последнее scheduled_time."""
+
+    def __init__(self, expected: int, error_rate: float, exact_size: int):
+        self.bloom = BloomFilter(max(expected * 2, 1024), error_rate)
+        self.exact: 'OrderedDict[str, datetime]' = OrderedDict()
+        self.exact_size = exact_size
+        self.built_at = time.monotonic()
+
+    def add(self, key: str, when: datetime) -> None:
+        self.bloom.add(key)
+        previous = self.exact.pop(key, None)
+        self.exact[key] = max(when, previous) if previous else when
+        if len(self.exact) > self.exact_size:
+            self.exact.popitem(last=False)
+
+    def lookup(self, keys: List[str], since: datetime) -> Optional[bool]:
+        """True — точно дубликат, False — точно новая запись, None — решает база."""
+        maybe = False
+        for key in keys:
+            if key not in self.bloom:
+                continue
+            when = self.exact.get(key)
+            if when is None:
+                # Ложное срабатывание фильтра или ключ вытеснен из LRU
+                maybe = True
+                continue
+            self.exact.move_to_end(key)
+            if when >= since:
+                return True
+        return None if maybe else False
+
+    def stale(self, max_age: float) -> bool:
+        return time.monotonic() - self.built_at > max_age or self.bloom.count > self.bloom.capacity
+
+
+def post_keys(guid: Optional[str], title_hash: Optional[str], content_hash: Optional[str]) -> List[str]:
+    keys = []
+    if guid:
+        keys.append('g:' + guid)
+    if title_hash:
+        keys.append('t:' + title_hash)
+    if content_hash:
+        keys.append('c:' + content_hash)
+    return keys
+
+
+class SeenIndex:
+    """Индекс уже виденных записей по каналам за окно дедупликации.
+
+    Держит в памяти GUID и отпечатки постов каждого канала, поэтому большинство
+    проверок на дубликат обходятся без запросов к БД. В базу идем только при
+    возможном совпадении, которое индекс не может подтвердить сам. Индекс канала
+    собирается при старте (warm) или лениво при первом обращении и периодически
+    пересобирается, чтобы из фильтра уходили записи, выпавшие из окна.
+    """
+
+    def __init__(self, exact_size: int = SEEN_INDEX_EXACT_SIZE, error_rate: float = SEEN_INDEX_ERROR_RATE,
+                 rebuild_after: int = SEEN_INDEX_REBUILD):
+        self.exact_size = exact_size
+        self.error_rate = error_rate
+        self.rebuild_after = rebuild_after
+        self._channels: Dict[int, _ChannelIndex] = {}
+        self.stats: Counter = Counter()
+
+    def _rows(self, db: Session, channel_id: Optional[int] = None):
+        query = db.query(Post.channel_id, Post.guid, Post.title_hash, Post.content_hash, Post.scheduled_time).filter(
+            Post.scheduled_time >= datetime.utcnow() - DEDUP_WINDOW
+        )
+        if channel_id is not None:
+            query = query.filter(Post.channel_id == channel_id)
+        return query.order_by(Post.scheduled_time.asc()).all()
+
+    def _build(self, rows) -> _ChannelIndex:
+        index = _ChannelIndex(len(rows) * 3, self.error_rate, self.exact_size)
+        for row in rows:
+            for key in post_keys(row.guid, row.title_hash, row.content_hash):
+                index.add(key, row.scheduled_time)
+        return index
+
+    def warm(self, db: Session) -> None:
+        """Загружает индекс для всех каналов одним запросом."""
+        by_channel: Dict[int, List] = {}
+        for row in self._rows(db):
+            by_channel.setdefault(row.channel_id, []).append(row)
+        self._channels = {channel_id: self._build(rows) for channel_id, rows in by_channel.items()}
+        self.stats['warmed_posts'] = sum(len(rows) for rows in by_channel.values())
+
+    def _channel(self, db: Session, channel_id: int) -> _ChannelIndex:
+        index = self._channels.get(channel_id)
+        if index is None or index.stale(self.rebuild_after):
+            index = self._build(self._rows(db, channel_id))
+            self._channels[channel_id] = index
+        return index
+
+    def is_duplicate(self, db: Session, channel_id: int, guid: Optional[str],
+                     title_hash: Optional[str], content_hash: Optional[str]) -> Optional[bool]:
+        verdict = self._channel(db, channel_id).lookup(
+            post_keys(guid, title_hash, content_hash), datetime.utcnow() - DEDUP_WINDOW
+        )
+        self.stats['memory_hit' if verdict else 'memory_miss' if verdict is False else 'db_fallback'] += 1
+        return verdict
+
+    def add(self, post: Post) -> None:
+        index = self._channels.get(post.channel_id)
+        # Ненагруженный канал соберется из БД при первом обращении, вместе с этим постом
+        if index is None or post.scheduled_time is None:
+            return
+        for key in post_keys(post.guid, post.title_hash, post.content_hash):
+            index.add(key, post.scheduled_time)
+
+    def invalidate(self, channel_id: int) -> None:
+        """Посты канала удалены: индекс пересоберется из БД при следующей проверке."""
+        self._channels.pop(channel_id, None)
+
+
+seen_index = SeenIndex()
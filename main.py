@@ -10,6 +10,12 @@ from config.settings import BOT_TOKEN, DATABASE_URL
 from bot.handlers import router
 from admin.panel import admin_router
 from core.scheduler import Scheduler
+from core.rss_parser import shutdown_parse_executor
+from core.http_client import close_http_session
+from database.models import SessionLocal
+from database.seen_index import seen_index
+from core.near_dup import near_dup
+from core.llm_cache import llm_cache
 
 # Optional: Postgres advisory lock
 from sqlalchemy import text
@@ -136,8 +142,17 @@ async def main():
 
     await set_main_menu(bot)
 
+    # Индексы дедупликации загружаем до первого опроса лент
+    db = SessionLocal()
+    try:
+        seen_index.warm(db)
+        near_dup.warm(db)
+    finally:
+        db.close()
+
     scheduler = Scheduler(bot)
     scheduler.start()
+    await scheduler.start_websub()
 
     try:
         logger.info("Бот запущен")
@@ -145,6 +160,10 @@ async def main():
         await dp.start_polling(bot)
     finally:
         scheduler.stop()
+        await scheduler.stop_websub()
+        shutdown_parse_executor()
+        await close_http_session()
+        llm_cache.close()
         await bot.session.close()
         _release_singleton_lock()
         logger.info("Бот остановлен")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Скрипт для проверки WebSub-приемника на локальном тестовом хабе (без внешней сети)
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("RSS_PARSE_EXECUTOR", "inline")
+
+HUB_PORT = 8791
+CALLBACK_PORT = 8792
+TOPIC = "http://127.0.0.1:8791/feed.xml"
+FEED = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Local feed</title>
+<item><guid>local-1</guid><title>Push entry</title><description>Delivered by the local hub</description></item>
+</channel></rss>"""
+
+
+async def start_hub(handler):
+    from aiohttp import web
+
+    hub_app = web.Application()
+    hub_app.router.add_post('/hub', handler)
+    hub_runner = web.AppRunner(hub_app)
+    await hub_runner.setup()
+    await web.TCPSite(hub_runner, '127.0.0.1', HUB_PORT).start()
+    return hub_runner
+
+
+async def run_roundtrip():
+    from aiohttp import web
+    from core.http_client import get_http_session, close_http_session
+    from core.websub import WebSubManager
+
+    verified = asyncio.Event()
+    delivered = asyncio.Event()
+    # Хаб подтверждает подписку только после того, как тест проверит состояние «ждет подтверждения»
+    release_hub = asyncio.Event()
+    received = {}
+
+    async def on_verified(topic, lease_seconds):
+        received['lease'] = lease_seconds
+        verified.set()
+
+    async def on_content(topic, body):
+        from core.rss_parser import parse_feed_content
+        received['entries'] = (await parse_feed_content(body))['entries']
+        delivered.set()
+
+    manager = WebSubManager(on_verified, on_content, callback_url=f"http://127.0.0.1:{CALLBACK_PORT}", secret="local")
+
+    # Минимальный хаб: подтверждает подписку запросом к callback и пушит ленту с подписью
+    async def hub_handler(request):
+        form = await request.post()
+
+        async def verify_and_publish():
+            await release_hub.wait()
+            query = urlencode({
+                'hub.mode': form['hub.mode'], 'hub.topic': form['hub.topic'],
+                'hub.challenge': 'challenge-42', 'hub.lease_seconds': '600',
+            })
+            async with get_http_session().get(f"{form['hub.callback']}?{query}") as rsp:
+                received['challenge'] = await rsp.text()
+            signature = hmac.new(form['hub.secret'].encode(), FEED, hashlib.sha256).hexdigest()
+            async with get_http_session().post(form['hub.callback'], data=FEED,
+                                               headers={'X-Hub-Signature': f'sha256={signature}'}) as rsp:
+                received['push_status'] = rsp.status
+            async with get_http_session().post(form['hub.callback'], data=FEED,
+                                               headers={'X-Hub-Signature': 'sha256=bad'}) as rsp:
+                received['forged_status'] = rsp.status
+
+        asyncio.create_task(verify_and_publish())
+        return web.Response(status=202)
+
+    hub_runner = await start_hub(hub_handler)
+    await manager.start('127.0.0.1', CALLBACK_PORT)
+
+    try:
+        accepted = await manager.subscribe(f"http://127.0.0.1:{HUB_PORT}/hub", TOPIC)
+        print(f"📨 Запрос подписки принят хабом: {accepted}")
+        assert accepted
+        assert manager.is_pending(TOPIC), "подписка должна ждать подтверждения хаба"
+        release_hub.set()
+
+        await asyncio.wait_for(verified.wait(), timeout=5)
+        print(f"✅ Подписка подтверждена (challenge: {received.get('challenge')}, аренда: {received['lease']} сек.)")
+        assert received.get('challenge') == 'challenge-42'
+        assert received['lease'] == 600
+        assert not manager.is_pending(TOPIC), "после подтверждения подписка не должна числиться ожидающей"
+
+        await asyncio.wait_for(delivered.wait(), timeout=5)
+        await asyncio.sleep(0.2)
+        titles = [e['title'] for e in received['entries']]
+        print(f"✅ Получено push-уведомление: {titles}")
+        assert titles == ['Push entry']
+        print(f"🔐 Уведомление с неверной подписью проигнорировано (ответ {received.get('forged_status')})")
+        assert received.get('push_status') == 202 and received.get('forged_status') == 202
+    finally:
+        await manager.stop()
+        await hub_runner.cleanup()
+        await close_http_session()
+
+
+async def run_renewal():
+    from aiohttp import web
+    from core.http_client import close_http_session
+    from core.scheduler import Scheduler
+    from core.websub import WebSubManager
+
+    requests = []
+
+    # Хаб принимает запросы, но не подтверждает их: подписка остается в ожидании
+    async def hub_handler(request):
+        requests.append(dict(await request.post()))
+        return web.Response(status=202)
+
+    async def ignore(*args):
+        pass
+
+    hub_runner = await start_hub(hub_handler)
+    scheduler = Scheduler(bot=None)
+    scheduler.websub = WebSubManager(ignore, ignore, callback_url=f"http://127.0.0.1:{CALLBACK_PORT}", secret="local")
+    now = datetime.utcnow()
+    # Аренда скоро истекает — источник в окне продления
+    source = SimpleNamespace(websub_hub=f"http://127.0.0.1:{HUB_PORT}/hub", websub_topic=TOPIC,
+                             websub_expires_at=now + timedelta(seconds=60))
+
+    async def tick():
+        scheduler._renew_websub([[source]], now)
+        await asyncio.sleep(0.2)
+
+    try:
+        await tick()
+        assert len(requests) == 1 and requests[0]['hub.mode'] == 'subscribe'
+        assert scheduler.websub.is_pending(TOPIC)
+
+        # Пока хаб не подтвердил продление, повторно его не запрашиваем
+        await tick()
+        await tick()
+        print(f"🔁 Продление в ожидании подтверждения: запросов к хабу {len(requests)}")
+        assert len(requests) == 1
+
+        # Хаб так и не ответил: по истечении срока ожидания запрос повторяется
+        scheduler.websub._PENDING_TTL = 0
+        await tick()
+        print(f"⏱ Ожидание истекло: запросов к хабу {len(requests)}")
+        assert len(requests) == 2
+    finally:
+        await hub_runner.cleanup()
+        await close_http_session()
+
+
+def test_websub():
+    """Поднимает тестовый хаб и приемник на localhost и проверяет полный цикл подписки и доставки"""
+    asyncio.run(run_roundtrip())
+
+
+def test_websub_renewal():
+    """Продление подписки не отправляется хабу повторно, пока предыдущий запрос ждет подтверждения"""
+    asyncio.run(run_renewal())
+
+
+def main():
+    print("🚀 Тест WebSub-приемника на локальном хабе")
+    print("=" * 50)
+
+    success = True
+    for test in (test_websub, test_websub_renewal):
+        try:
+            test()
+        except ImportError as e:
+            print(f"❌ Ошибка импорта: {e}")
+            print("🔧 Убедитесь, что все зависимости установлены:")
+            print("pip install -r requirements.txt")
+            success = False
+        except (AssertionError, asyncio.TimeoutError) as e:
+            print(f"❌ {test.__name__}: {e or 'проверка не прошла'}")
+            success = False
+
+    print("\n" + "=" * 50)
+    if success:
+        print("🎉 Тест завершен успешно! Push-доставка работает.")
+    else:
+        print("💥 Тест не пройден.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import re
 import hashlib
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import asyncio
 from aiogram.exceptions import TelegramBadRequest
 
@@ -16,6 +16,27 @@ def generate_post_hash(content: str) -> str:
     return hashlib.md5(content.encode()).hexdigest()
 
 
+_FINGERPRINT_NOISE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def _fingerprint(text: Optional[str], limit: int) -> Optional[str]:
+    # Регистр, пунктуация и пробелы не должны влиять на совпадение
+    normalized = _FINGERPRINT_NOISE.sub(' ', (text or '').lower()).strip()[:limit]
+    if not normalized:
+        return None
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def title_fingerprint(title: Optional[str]) -> Optional[str]:
+    """Отпечаток нормализованного заголовка для индексируемой проверки дубликатов."""
+    return _fingerprint(title, 300)
+
+
+def content_fingerprint(content: Optional[str]) -> Optional[str]:
+    """Отпечаток первых 200 нормализованных символов текста записи."""
+    return _fingerprint(content, 200)
+
+
 def calculate_next_post_time(interval: int, last_post: Optional[datetime] = None) -> datetime:
     if last_post:
         return last_post + timedelta(seconds=interval)
@@ -49,6 +70,21 @@ def extract_domain(url: str) -> str:
     return urlparse(url).netloc
 
 
+def normalize_feed_url(url: str) -> str:
+    """Приводит URL ленты к каноническому виду, чтобы одинаковые ленты разных каналов совпадали.
+
+    Схема и хост в нижнем регистре, без порта по умолчанию, фрагмента и завершающего слэша.
+    """
+    from urllib.parse import urlsplit, urlunsplit
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'http'
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((scheme, host, path, parts.query, ''))
+
+
 def format_time_delta(delta: timedelta) -> str:
     days = delta.days
     hours, remainder = divmod(delta.seconds, 3600)
@@ -75,19 +111,51 @@ async def retry_async(func, max_attempts: int = 3, delay: int = 1):
             await asyncio.sleep(delay * (attempt + 1))
 
 
-def clean_rss_content(html_content: str) -> str:
+def extract_text_and_images(html_content: str, max_length: int = 2000, max_images: int = 3) -> Tuple[str, List[str]]:
+    """Разбирает HTML записи один раз: нормализованный текст (без script/style) и ссылки на картинки.
+
+    Использует lxml; если он не установлен — BeautifulSoup с html.parser.
+    """
+    if not html_content or not html_content.strip():
+        return '', []
+
+    try:
+        import lxml.html
+        from lxml import etree
+    except ImportError:
+        return _extract_text_and_images_bs4(html_content, max_length, max_images)
+
+    try:
+        root = lxml.html.fragment_fromstring(html_content, create_parent='div')
+    except (etree.ParserError, ValueError):
+        return ' '.join(html_content.split())[:max_length], []
+
+    images = []
+    for index, img in enumerate(root.iter('img')):
+        if index >= max_images:
+            break
+        src = img.get('src')
+        if src and src.startswith('http'):
+            images.append(src)
+
+    etree.strip_elements(root, 'script', 'style', etree.Comment, with_tail=False)
+    text = ' '.join(' '.join(root.itertext()).split())
+    return text[:max_length], images
+
+
+def _extract_text_and_images_bs4(html_content: str, max_length: int, max_images: int) -> Tuple[str, List[str]]:
     from bs4 import BeautifulSoup
     soup = BeautifulSoup(html_content, 'html.parser')
+    images = [img.get('src') for img in soup.find_all('img', limit=max_images)]
+    images = [src for src in images if src and src.startswith('http')]
+    for tag in soup(["script", "style"]):
+        tag.decompose()
+    text = ' '.join(soup.get_text(separator=' ', strip=True).split())
+    return text[:max_length], images
 
-    for script in soup(["script", "style"]):
-        script.decompose()
-
-    text = soup.get_text()
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    text = ' '.join(chunk for chunk in chunks if chunk)
 
-    return text[:2000]
+def clean_rss_content(html_content: str) -> str:
+    return extract_text_and_images(html_content)[0]
 
 
 async def safe_edit_text(message, text: str, **kwargs):